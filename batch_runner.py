@@ -0,0 +1,188 @@
+"""
+Headless batch mode for SQLAssistant.
+
+Reads questions from a JSONL file and answers them as a two-stage pipeline:
+SQL generation and query execution run on separate, bounded thread pools, so
+the next questions are being generated while earlier ones execute. Each answer
+is written to the output JSONL file as soon as it finishes, which means the
+output order follows completion and not the input order.
+
+Input lines are either a JSON string or an object with a "question" key and an
+optional "id" (defaults to the line number).
+
+Usage:
+    python batch_runner.py questions.jsonl -o answers.jsonl
+        [--database company_v2] [--generate-workers 4] [--execute-workers 8] [--max-rows 1000] [--allow-expensive]
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sql_assistant import (
+    DATABASES,
+    MAX_CONCURRENT_QUERIES,
+    MAX_RESULT_ROWS,
+    QUERY_TIMEOUT,
+    VANNA_API_KEY,
+    SQLAssistant,
+    SQLValidationError,
+    build_instrumentation,
+)
+
+GENERATE_WORKERS = 4  # Concurrent generate_sql calls against the Vanna API
+EXECUTE_WORKERS = MAX_CONCURRENT_QUERIES  # Concurrent queries against the database
+MAX_IN_FLIGHT = 64  # Questions read ahead of the slowest unfinished answer
+
+
+def read_questions(path):
+    """Yield {'id', 'question'} dicts from a JSONL file, skipping blank lines."""
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {'question': record}
+            yield {'id': record.get('id', line_number), 'question': record['question']}
+
+
+class BatchRunner:
+    """Answers a stream of questions with overlapping generation and execution stages."""
+
+    def __init__(self, assistant, output, generate_workers=GENERATE_WORKERS, execute_workers=EXECUTE_WORKERS,
+                 max_in_flight=MAX_IN_FLIGHT, max_rows=MAX_RESULT_ROWS, timeout=QUERY_TIMEOUT,
+                 allow_expensive=False):
+        """`output` is a text file object; one JSON line is written per answered question."""
+        self.assistant = assistant
+        self.output = output
+        self.generate_workers = generate_workers
+        self.execute_workers = execute_workers
+        self.max_rows = max_rows
+        self.timeout = timeout
+        self.allow_expensive = allow_expensive
+        self.counts = {}
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._write_lock = threading.Lock()
+
+    def run(self, questions):
+        """Answer every question and return the number of answers per status."""
+        with ThreadPoolExecutor(self.generate_workers, thread_name_prefix="batch-generate") as generate_pool, \
+                ThreadPoolExecutor(self.execute_workers, thread_name_prefix="batch-execute") as execute_pool:
+            self._execute_pool = execute_pool
+            for record in questions:
+                # Bound read-ahead so a huge input file doesn't queue up in memory
+                self._slots.acquire()
+                generate_pool.submit(self._generate, record)
+            # Generation must drain before execution stops accepting work
+            generate_pool.shutdown(wait=True)
+        return dict(self.counts)
+
+    def _generate(self, record):
+        """Stage 1: turn the question into SQL, then hand it to the execution pool."""
+        start = time.perf_counter()
+        try:
+            sql = self.assistant.generate(record['question'])
+            record['generate_seconds'] = round(time.perf_counter() - start, 4)
+            record['sql'] = sql
+            if not sql or not self.assistant.is_sql_valid(sql):
+                self._finish(record, 'no_sql')
+                return
+            self._execute_pool.submit(self._execute, record)
+        except SQLValidationError as e:
+            # Rejected by local schema validation even after one regeneration
+            record['generate_seconds'] = round(time.perf_counter() - start, 4)
+            record['validation_errors'] = e.errors
+            self._finish(record, 'invalid_sql', error=str(e))
+        except Exception as e:
+            record['generate_seconds'] = round(time.perf_counter() - start, 4)
+            self._finish(record, 'error', error=f"Error generating SQL: {str(e)}")
+
+    def _execute(self, record):
+        """Stage 2: cost-check and run the SQL, then write the answer."""
+        start = time.perf_counter()
+        try:
+            estimate = self.assistant.check_query_cost(record['sql'])
+            if estimate['action'] == 'reject' or (estimate['action'] == 'confirm' and not self.allow_expensive):
+                self._finish(record, 'skipped', error=estimate['reason'])
+                return
+            record['sql'] = estimate['sql']
+            df = self.assistant.execute(record['sql'], max_rows=self.max_rows, timeout=self.timeout)
+            record['execute_seconds'] = round(time.perf_counter() - start, 4)
+            record['columns'] = [str(column) for column in df.columns]
+            record['rows'] = df.astype(object).where(df.notna(), None).values.tolist()
+            record['truncated'] = bool(df.attrs.get('truncated', False))
+            self._finish(record, 'ok')
+        except Exception as e:
+            record['execute_seconds'] = round(time.perf_counter() - start, 4)
+            self._finish(record, 'error', error=f"Error executing SQL: {str(e)}")
+
+    def _finish(self, record, status, error=None):
+        """Write one answer line and free its read-ahead slot."""
+        record['status'] = status
+        if error:
+            record['error'] = error
+        line = json.dumps(record, default=str)
+        with self._write_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+            self.counts[status] = self.counts.get(status, 0) + 1
+        self._slots.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions without the Streamlit UI")
+    parser.add_argument('questions', help="JSONL file of questions")
+    parser.add_argument('-o', '--output', default='-', help="JSONL file to write answers to ('-' for stdout)")
+    parser.add_argument('--database', choices=list(DATABASES), default=next(iter(DATABASES)),
+                        help="Database to answer against")
+    parser.add_argument('--generate-workers', type=int, default=GENERATE_WORKERS, help="Concurrent SQL generations")
+    parser.add_argument('--execute-workers', type=int, default=EXECUTE_WORKERS, help="Concurrent query executions")
+    parser.add_argument('--max-in-flight', type=int, default=MAX_IN_FLIGHT, help="Questions read ahead")
+    parser.add_argument('--max-rows', type=int, default=MAX_RESULT_ROWS, help="Row cap per answer")
+    parser.add_argument('--timeout', type=float, default=QUERY_TIMEOUT, help="Per-query timeout in seconds")
+    parser.add_argument('--allow-expensive', action='store_true',
+                        help="Run queries the cost guard would ask a user to confirm")
+    args = parser.parse_args()
+
+    # Setup and training messages are logged when there is no Streamlit page to show them on
+    logging.basicConfig(format="%(message)s")
+    logging.getLogger("sqlwizard").setLevel(logging.INFO)
+    try:
+        from streamlit.logger import set_log_level
+        set_log_level("error")
+    except ImportError:
+        pass
+
+    assistant = SQLAssistant(api_key=VANNA_API_KEY, instrumentation=build_instrumentation(), database=args.database)
+    if not assistant.setup_database():
+        sys.exit(f"Failed to connect to database {args.database}")
+
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    start = time.perf_counter()
+    try:
+        runner = BatchRunner(
+            assistant, output,
+            generate_workers=args.generate_workers,
+            execute_workers=args.execute_workers,
+            max_in_flight=args.max_in_flight,
+            max_rows=args.max_rows,
+            timeout=args.timeout,
+            allow_expensive=args.allow_expensive,
+        )
+        counts = runner.run(read_questions(args.questions))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    total = sum(counts.values())
+    print(f"answered {total} questions in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f}/s): {counts}",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
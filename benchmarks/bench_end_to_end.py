@@ -0,0 +1,304 @@
+"""
+Offline end-to-end benchmark for SQLAssistant.
+
+Replaces the remote VannaDefault calls with a deterministic local stub that has
+configurable latency, loads the company (and ecommerce) sample databases into a
+local MySQL server, and replays the question_sql_pairs from training_examples.yaml.
+Reports p50/p95/p99 for setup, training, generation, execution and rendering,
+plus throughput at several concurrent session counts.
+
+Usage:
+    python benchmarks/bench_end_to_end.py --db-url mysql+pymysql://root:pw@localhost:3306
+        [--generate-latency 0.8] [--train-latency 0.2] [--rounds 3] [--sessions 1,4,16]
+"""
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import pandas as pd
+import yaml
+from sqlalchemy import create_engine, text
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import sql_assistant  # noqa: E402
+from sql_assistant import QuestionCache, SQLAssistant  # noqa: E402
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+try:
+    from streamlit.logger import set_log_level
+    set_log_level("error")
+except ImportError:
+    pass
+
+DATABASE_SCRIPTS = {
+    'company_v2': ['company_db_setup.sql', 'company_sample_data.sql'],
+    'ecommerce': ['ecommerce_db_setup.sql', 'ecommerce_sample_data.sql'],
+}
+
+
+def load_pairs():
+    """Return the curated (question, sql) pairs from training_examples.yaml."""
+    with open(os.path.join(ROOT, 'training_examples.yaml')) as f:
+        data = yaml.safe_load(f)
+    return [
+        (pair['question'], pair['sql'])
+        for category in data.get('question_sql_pairs', [])
+        for pair in category.get('pairs', [])
+    ]
+
+
+class StubAssistant(SQLAssistant):
+    """SQLAssistant whose Vanna API calls are answered locally after a fixed delay."""
+
+    generate_latency = 0.0
+    train_latency = 0.0
+    answers = {}
+    training_seconds = []
+
+    def generate_sql(self, question, **kwargs):
+        time.sleep(self.generate_latency)
+        return self.answers.get(QuestionCache.normalize(question), "SELECT 1")
+
+    def train(self, **kwargs):
+        time.sleep(self.train_latency)
+        return str(uuid.uuid4())
+
+    def remove_training_data(self, id, **kwargs):
+        time.sleep(self.train_latency)
+        return True
+
+    def train_model(self):
+        start = time.perf_counter()
+        try:
+            return super().train_model()
+        finally:
+            self.training_seconds.append(time.perf_counter() - start)
+
+
+def split_statements(script):
+    """Split a SQL script on semicolons that are outside quotes and comments."""
+    statements = []
+    current = []
+    quote = None
+    i = 0
+    while i < len(script):
+        char = script[i]
+        if quote:
+            current.append(char)
+            if char == '\\':
+                current.append(script[i + 1])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in ("'", '"', '`'):
+            quote = char
+            current.append(char)
+        elif script.startswith('--', i):
+            end = script.find('\n', i)
+            i = len(script) if end == -1 else end
+            continue
+        elif char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    tail = ''.join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def load_databases(server_url):
+    """Create the sample databases from the repo's setup and data scripts."""
+    engine = create_engine(server_url)
+    timings = {}
+    for database, scripts in DATABASE_SCRIPTS.items():
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for script in scripts:
+                with open(os.path.join(ROOT, script)) as f:
+                    for statement in split_statements(f.read()):
+                        conn.execute(text(statement))
+        timings[database] = time.perf_counter() - start
+    engine.dispose()
+    return timings
+
+
+def render(df):
+    """Approximate what Streamlit does to ship a DataFrame to the browser."""
+    if pa is not None:
+        table = pa.Table.from_pandas(df)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.tell()
+    return len(df.to_json(orient='split'))
+
+
+def new_assistant(state_dir, database=None):
+    """Create a stubbed assistant whose state files live in `state_dir`."""
+    assistant = StubAssistant(api_key="benchmark", database=database)
+    assistant.model_state_file = os.path.join(state_dir, 'model_state.json')
+    assistant.training_data_file = os.path.join(state_dir, 'training_data.json')
+    if assistant.examples_file:
+        assistant.examples_file = os.path.join(ROOT, assistant.examples_file)
+    assistant.question_cache = QuestionCache(path=None)
+    return assistant
+
+
+def ask(assistant, question, samples):
+    """Answer one question the way the chat does and record per-stage timings.
+
+    Returns False when no SQL was generated, in which case nothing is executed.
+    """
+    start = time.perf_counter()
+    sql = assistant.get_sql_for_question(question)
+    samples['generation'].append(time.perf_counter() - start)
+    if not sql:
+        return False
+
+    start = time.perf_counter()
+    estimate = assistant.check_query_cost(sql)
+    results = assistant.fetch_page(estimate['sql'], 0) if estimate['action'] in ('allow', 'limit') else None
+    samples['execution'].append(time.perf_counter() - start)
+
+    if results is not None:
+        start = time.perf_counter()
+        render(results)
+        samples['rendering'].append(time.perf_counter() - start)
+    return True
+
+
+def percentiles(values):
+    """Return p50/p95/p99 in milliseconds."""
+    if not values:
+        return None
+    series = pd.Series(values) * 1000
+    return series.quantile(0.5), series.quantile(0.95), series.quantile(0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--db-url', default=os.environ.get('BENCH_MYSQL_URL'),
+                        help="MySQL server URL without a database, e.g. mysql+pymysql://root:pw@localhost:3306")
+    parser.add_argument('--skip-load', action='store_true', help="Reuse already loaded sample databases")
+    parser.add_argument('--generate-latency', type=float, default=0.8, help="Stub generate_sql latency (s)")
+    parser.add_argument('--train-latency', type=float, default=0.2, help="Stub train latency (s)")
+    parser.add_argument('--setup-runs', type=int, default=3, help="Cold setups to time")
+    parser.add_argument('--rounds', type=int, default=3, help="Times to replay every question")
+    parser.add_argument('--sessions', default="1,4,16", help="Concurrent session counts for throughput")
+    parser.add_argument('--retrieval-threshold', type=float, default=None,
+                        help="Curated-pair fast path threshold for the replay; off by default so generation "
+                             "calls the (stub) model, with a separate fast_path replay at RETRIEVAL_THRESHOLD")
+    args = parser.parse_args()
+    if not args.db_url:
+        parser.error("--db-url (or BENCH_MYSQL_URL) is required")
+
+    url = urlparse(args.db_url)
+    sql_assistant.DB_CONFIG.update({
+        'host': url.hostname or 'localhost',
+        'user': url.username or 'root',
+        'password': url.password or '',
+        'port': url.port or 3306,
+    })
+
+    print(f"import sql_assistant {sql_assistant.IMPORT_SECONDS * 1000:9.1f} ms")
+
+    if not args.skip_load:
+        for database, seconds in load_databases(args.db_url).items():
+            print(f"loaded {database:<12} {seconds * 1000:9.1f} ms")
+
+    pairs = load_pairs()
+    StubAssistant.generate_latency = args.generate_latency
+    StubAssistant.train_latency = args.train_latency
+    StubAssistant.answers = {QuestionCache.normalize(q): sql for q, sql in pairs}
+
+    sql_assistant.RETRIEVAL_THRESHOLD = args.retrieval_threshold
+
+    samples = {stage: [] for stage in ('setup', 'training', 'generation', 'fast_path', 'execution', 'rendering')}
+
+    # Cold setups: fresh state files every time, so each one trains from scratch
+    assistant = None
+    for _ in range(args.setup_runs):
+        state_dir = tempfile.mkdtemp(prefix="sqlwizard-bench-")
+        assistant = new_assistant(state_dir)
+        before = len(StubAssistant.training_seconds)
+        start = time.perf_counter()
+        if not assistant.setup_database():
+            sys.exit("setup_database failed; is the company_v2 database loaded?")
+        elapsed = time.perf_counter() - start
+        trained = sum(StubAssistant.training_seconds[before:])
+        samples['setup'].append(elapsed - trained)
+        samples['training'].append(trained)
+
+    # Replay every curated question through the warm assistant
+    no_sql = 0
+    for _ in range(args.rounds):
+        for question, _ in pairs:
+            if not ask(assistant, question, samples):
+                no_sql += 1
+
+    # The replayed questions are the curated ones, so with the fast path on they never reach the model
+    if args.retrieval_threshold is None:
+        assistant.question_index.threshold = sql_assistant.RETRIEVAL_THRESHOLD
+        fast = {stage: [] for stage in samples}
+        for question, _ in pairs:
+            ask(assistant, question, fast)
+        samples['fast_path'] = fast['generation']
+        assistant.question_index.threshold = None
+
+    print(f"\n{'stage':<12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'n':>6}")
+    for stage, values in samples.items():
+        stats = percentiles(values)
+        if stats:
+            print(f"{stage:<12}{stats[0]:>10.1f}{stats[1]:>10.1f}{stats[2]:>10.1f}{len(values):>6}")
+    if no_sql:
+        print(f"{no_sql} questions produced no SQL and were not executed")
+
+    # Throughput: N sessions sharing one warm assistant, each replaying all questions
+    print(f"\n{'sessions':<12}{'questions/s':>12}")
+    for sessions in [int(n) for n in args.sessions.split(',')]:
+        assistant.question_cache.clear()
+        assistant.result_cache.clear()
+        scratch = {stage: [] for stage in samples}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=sessions) as pool:
+            list(pool.map(
+                lambda _: [ask(assistant, question, scratch) for question, _ in pairs],
+                range(sessions)
+            ))
+        elapsed = time.perf_counter() - start
+        print(f"{sessions:<12}{sessions * len(pairs) / elapsed:>12.1f}")
+
+    # Serving a second database: its engine, catalog and training are only set up on first use
+    print(f"\n{'database':<12}{'first use ms':>14}")
+    for database in list(sql_assistant.DATABASES)[1:]:
+        other = new_assistant(tempfile.mkdtemp(prefix="sqlwizard-bench-"), database)
+        start = time.perf_counter()
+        if other.setup_database():
+            print(f"{database:<12}{(time.perf_counter() - start) * 1000:>14.1f}")
+        other.close()
+
+    print(f"\nquestion cache: {assistant.question_cache.hits} hits, {assistant.question_cache.misses} misses")
+    print(f"result cache:   {assistant.result_cache.stats()}")
+    print(f"fast path:      {assistant.question_index.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -3,78 +3,1742 @@ SQL Query Assistant using Vanna.AI and Streamlit
 Provides natural language to SQL conversion with persistent model training state.
 """
 
+import time
+_SCRIPT_STARTED = time.perf_counter()  # Taken before the heavy imports to measure cold start
+
 import os
+import sys
 import json
-import yaml
+import logging
 from datetime import datetime
 import pandas as pd
 import streamlit as st
-from sqlalchemy import create_engine, text
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 from vanna.remote import VannaDefault
-import time
+import requests
 import hashlib
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import re
+import math
+import gzip
+import shutil
+import tempfile
+import uuid
+import weakref
+import importlib.util
+from collections import Counter, OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def lazy_import(name):
+    """Return a module whose real import is deferred until its first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+# Not needed to paint the page; only loaded once an assistant connects.
+# pandas stays eager because vanna.remote, which SQLAssistant subclasses, imports it anyway.
+sqlalchemy = lazy_import("sqlalchemy")
 
 # Configuration
 VANNA_API_KEY = ""
 MODEL_NAME = "sqlcompanybot"  # Fixed model name linked to API key
-DB_CONFIG = {
+DB_CONFIG = {  # Server credentials shared by every database in DATABASES
     "host": "localhost",
     "user": "root",
     "password": "1551",
-    "dbname": "company_v2",
     "port": 3306
 }
+POOL_CONFIG = {
+    "pool_size": 5,  # Connections kept open for all sessions
+    "max_overflow": 10,  # Extra connections allowed under burst load
+    "pool_pre_ping": True,  # Detect connections MySQL has already dropped
+    "pool_recycle": 1800,  # Seconds; keep below MySQL's wait_timeout
+    "pool_timeout": 10  # Seconds to wait for a free connection before failing
+}
+DATABASES = {  # Databases this process can serve; the first one is the default
+    "company_v2": {
+        "model": MODEL_NAME,
+        "examples_file": "training_examples.yaml",
+        "model_state_file": "model_state.json",
+        "training_data_file": "training_data.json",
+        "required_columns": {  # Tables (and columns) that must exist for the schema to be accepted
+            "departments": [],
+            "employees": ['emp_id', 'first_name', 'last_name', 'manager_id', 'dept_id', 'job_title'],
+            "job_grades": [],
+            "projects": [],
+            "skills": [],
+            "performance_reviews": [],
+        },
+    },
+    "ecommerce": {
+        "model": "sqlecommercebot",  # Must already exist in the Vanna account; omit to use MODEL_NAME
+        "required_columns": {
+            "users": ['user_id', 'email'],
+            "products": [],
+            "orders": [],
+        },
+    },
+}
+DATABASE_IDLE_TIMEOUT = 30 * 60  # Seconds before an unused database's engine and caches are released
+QUERY_TIMEOUT = 30  # Seconds a query may run before it is killed
+MAX_CONCURRENT_QUERIES = 8  # Queries allowed to run at once in this process
+COST_GUARD = {
+    "large_table_rows": 100_000,  # Tables with at least this many rows count as large
+    "auto_limit_rows": 10_000,  # Estimated rows examined above which a LIMIT is injected
+    "confirm_rows": 1_000_000,  # Estimated rows examined above which the user must confirm
+    "reject_rows": 100_000_000,  # Estimated rows examined above which the query is refused
+    "auto_limit": 1000  # LIMIT injected into expensive queries that have none
+}
+PLAN_CACHE_SIZE = 256  # Cached EXPLAIN cost estimates
+HEALTH_CHECK_INTERVAL = 30  # Seconds between background database health checks
+QUESTION_CACHE_SIZE = 512  # Max cached question -> SQL entries
+QUESTION_CACHE_TTL = 24 * 60 * 60  # Seconds before a cached SQL answer expires
+QUESTION_CACHE_FILE = "question_cache.json"  # Prefixed with the database name; None keeps caches in memory only
+RETRIEVAL_THRESHOLD = 0.9  # Similarity above which a curated pair's SQL is reused; None disables the fast path
+MAX_RESULT_ROWS = 10000  # Row cap for a single query result; larger results are truncated
+STREAM_CHUNK_SIZE = 1000  # Rows fetched per round trip from the server-side cursor
+PAGE_SIZE = 100  # Rows rendered per results page in the chat
+RESULT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Total DataFrame memory the result cache may hold
+RESULT_CACHE_VERSION_TTL = 5  # Seconds to reuse table version signals before re-checking
+EXPORT_CHUNK_ROWS = 50_000  # Rows serialized per write when building an export file
+EXPORT_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Disk space memoized export files may use
+EXPORT_FORMATS = {  # label -> (file extension, MIME type, needs pyarrow)
+    "CSV": ("csv", "text/csv", False),
+    "CSV (gzip)": ("csv.gz", "application/gzip", False),
+    "Parquet": ("parquet", "application/vnd.apache.parquet", True),
+    "Arrow": ("arrow", "application/vnd.apache.arrow.file", True),
+}
+HISTORY_RESULTS_IN_MEMORY = 5  # Newest chat results kept as DataFrames; older ones spill to disk
+TRAINING_CONCURRENCY = 4  # Parallel train() calls against the Vanna API
+TRAINING_RATE_LIMIT = 5.0  # Max train() calls started per second
+TRAINING_MAX_RETRIES = 3  # Retries per example on transient errors
+TRAINING_RETRY_BACKOFF = 0.5  # Initial retry delay in seconds, doubled on every attempt
+TRANSIENT_HTTP_STATUSES = {408, 425, 429, 500, 502, 503, 504}  # Vanna API responses worth retrying
+SCHEMA_CHECK_INTERVAL = 10  # Seconds to trust the cached schema catalog before re-checking its fingerprint
+SCHEMA_WATCH_INTERVAL = 30  # Seconds between background schema fingerprint polls
+SQL_VALIDATION = True  # Check generated SQL against the schema catalog before running it (needs sqlglot)
+TRAINING_PACK_VERSION = 1  # Bump whenever example parsing changes so existing packs are rebuilt
+COLD_START_BUDGET = 5.0  # Seconds from script start to first paint; slower cold starts are logged
+METRICS_SINKS = []  # Any of "json", "prometheus", "panel"; empty disables instrumentation
+METRICS_HOST = "127.0.0.1"  # Interface of the Prometheus text endpoint; "0.0.0.0" exposes it to the network
+METRICS_PORT = 9464  # Port of the Prometheus text endpoint
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Histogram bounds, seconds
+
+def database_settings(name=None):
+    """Return connection, model and state file settings for a database in DATABASES."""
+    name = name or next(iter(DATABASES))
+    if name not in DATABASES:
+        raise ValueError(f"Unknown database: {name}")
+    settings = {
+        **DB_CONFIG,
+        "dbname": name,
+        "model": MODEL_NAME,
+        "examples_file": None,
+        "model_state_file": f"{name}_model_state.json",
+        "training_data_file": f"{name}_training_data.json",
+        "question_cache_file": f"{name}_{QUESTION_CACHE_FILE}" if QUESTION_CACHE_FILE else None,
+        "required_columns": {},
+    }
+    settings.update(DATABASES[name])
+    return settings
+
+def notify(level, message):
+    """Show a status message with st.error/warning/info/success, or log it off the script thread.
+
+    Background threads (schema watcher, health check) and headless runs have no
+    Streamlit script context, so their messages go to the "sqlwizard" logger.
+    """
+    if get_script_run_ctx(suppress_warning=True) is not None:
+        getattr(st, level)(message)
+    else:
+        log_level = {'error': logging.ERROR, 'warning': logging.WARNING}.get(level, logging.INFO)
+        logging.getLogger("sqlwizard").log(log_level, message)
+
+class QuestionCache:
+    """LRU/TTL cache of generated SQL, keyed by schema hash and normalized question."""
+
+    def __init__(self, max_size=QUESTION_CACHE_SIZE, ttl=QUESTION_CACHE_TTL, path=QUESTION_CACHE_FILE):
+        """Create the cache and load any entries persisted by a previous process."""
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (sql, created_at)
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def normalize(question):
+        """Normalize a question so trivially re-worded prompts share a cache entry."""
+        return " ".join(question.lower().split()).rstrip("?.! ")
+
+    def _key(self, schema_hash, question):
+        return f"{schema_hash}:{self.normalize(question)}"
+
+    def get(self, schema_hash, question):
+        """Return the cached SQL for a question, or None on a miss or expired entry."""
+        key = self._key(schema_hash, question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[1] > self.ttl:
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, schema_hash, question, sql):
+        """Cache the SQL generated for a question, evicting the least recently used entries."""
+        with self._lock:
+            key = self._key(schema_hash, question)
+            self._entries[key] = (sql, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def clear(self):
+        """Drop every cached entry."""
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def _load(self):
+        """Load unexpired entries from disk, if persistence is enabled."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+            now = time.time()
+            for key, sql, created_at in entries[-self.max_size:]:
+                if now - created_at <= self.ttl:
+                    self._entries[key] = (sql, created_at)
+        except (OSError, ValueError):
+            # A corrupt cache file is not worth failing startup over
+            self._entries.clear()
+
+    def _save(self):
+        """Atomically persist the cache to disk, if persistence is enabled."""
+        if not self.path:
+            return
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump([[key, sql, created_at] for key, (sql, created_at) in self._entries.items()], f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+class QuestionIndex:
+    """TF-IDF index over the curated question_sql_pairs, answering close matches locally.
+
+    Questions are vectorized as word unigrams and bigrams weighted by IDF, so a
+    rare word that differs (a department name, a year) weighs more than filler.
+    Words never seen in the curated questions still count against the match.
+    """
+
+    def __init__(self, examples=(), threshold=RETRIEVAL_THRESHOLD):
+        """Build the index from (type, content) training examples; only 'pair' entries are used."""
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.build(examples)
+
+    @staticmethod
+    def _terms(question):
+        words = re.findall(r"\w+", QuestionCache.normalize(question))
+        return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+    def _vector(self, terms):
+        """Return the L2-normalized TF-IDF weights of a term Counter."""
+        weights = {term: (1 + math.log(count)) * self._idf.get(term, self._unseen_idf) for term, count in terms.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+        return {term: weight / norm for term, weight in weights.items()}
+
+    def build(self, examples):
+        """Replace the indexed pairs with the 'pair' entries of `examples`."""
+        pairs = [tuple(content) for example_type, content in examples if example_type == 'pair']
+        terms = [self._terms(question) for question, _ in pairs]
+        document_frequency = Counter(term for counts in terms for term in counts)
+        idf = {term: math.log((1 + len(pairs)) / (1 + count)) + 1 for term, count in document_frequency.items()}
+        postings = defaultdict(list)  # term -> [(pair index, weight)]
+        with self._lock:
+            self._idf = idf
+            self._unseen_idf = math.log(1 + len(pairs)) + 1
+            for index, counts in enumerate(terms):
+                for term, weight in self._vector(counts).items():
+                    postings[term].append((index, weight))
+            self._pairs = pairs
+            self._postings = dict(postings)
+
+    def lookup(self, question):
+        """Return (sql, score, curated question) for the best match above threshold, else None."""
+        if self.threshold is None:
+            return None
+        with self._lock:
+            scores = defaultdict(float)
+            for term, weight in self._vector(self._terms(question)).items():
+                for index, pair_weight in self._postings.get(term, ()):
+                    scores[index] += weight * pair_weight
+            best = max(scores, key=scores.get, default=None)
+            if best is None or scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            question, sql = self._pairs[best]
+            return sql, scores[best], question
+
+    def stats(self):
+        """Return fast-path counters for the sidebar."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'pairs': len(self._pairs),
+                'threshold': self.threshold,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+_LEADING_COMMENTS = re.compile(r"^\s*(?:(?:--[^\n]*(?:\n|$)|#[^\n]*(?:\n|$)|/\*.*?\*/)\s*)*", re.DOTALL)
+
+def is_select(sql):
+    """Return True if the statement is a SELECT (or WITH ... SELECT) query."""
+    body = _LEADING_COMMENTS.sub("", sql).lstrip("( \t\r\n")
+    first_word = body.split(None, 1)[0].upper() if body else ""
+    return first_word in ("SELECT", "WITH")
+
+def unique_columns(columns):
+    """Suffix repeated column names (id, id_2, ...) so they can name a derived table's columns."""
+    seen = set()
+    renamed = []
+    for column in columns:
+        name = str(column)
+        suffix = 2
+        while name.lower() in seen:
+            name = f"{column}_{suffix}"
+            suffix += 1
+        seen.add(name.lower())
+        renamed.append(name)
+    return renamed
+
+class ResultCache:
+    """Memory-bounded cache of read-only query results, invalidated per table.
+
+    Each entry remembers the version signal (UPDATE_TIME, TABLE_ROWS) of every
+    table its SQL mentions; it is dropped as soon as any of those versions moves.
+    Results that can't be tied to such a signal are not cached at all.
+    """
+
+    _NON_DETERMINISTIC = re.compile(
+        r"\b(NOW|SYSDATE|CURDATE|CURTIME|CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|"
+        r"UTC_DATE|UTC_TIME|UTC_TIMESTAMP|UNIX_TIMESTAMP|RAND|UUID|UUID_SHORT|CONNECTION_ID|"
+        r"LAST_INSERT_ID)\b|\bFOR\s+UPDATE\b|\bINTO\b|\bLOCK\s+IN\s+SHARE\s+MODE\b",
+        re.IGNORECASE,
+    )
+    _TOKENS = re.compile(r"('(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"|`[^`]*`)|\s+")
+    _QUALIFIED_TABLE = re.compile(r"\b(?:FROM|JOIN)\s+`?(\w+)`?\s*\.\s*`?\w+", re.IGNORECASE)
+
+    def __init__(self, version_loader, max_bytes=RESULT_CACHE_MAX_BYTES, version_ttl=RESULT_CACHE_VERSION_TTL,
+                 database=None):
+        """Create the cache; `version_loader` returns {table_name: version} for `database`.
+
+        Views map to a None version: they have no version signal of their own.
+        """
+        self.version_loader = version_loader
+        self.database = database
+        self.max_bytes = max_bytes
+        self.version_ttl = version_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.untracked = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # (sql, window) -> (df, nbytes, {table: version})
+        self._versions = None
+        self._versions_loaded_at = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def normalize(cls, sql):
+        """Collapse whitespace outside quoted literals and drop a trailing semicolon."""
+        normalized = cls._TOKENS.sub(lambda m: m.group(1) or " ", sql.strip())
+        return normalized.rstrip("; ")
+
+    @classmethod
+    def is_cacheable(cls, sql):
+        """Only deterministic, read-only SELECT statements are safe to cache."""
+        return is_select(sql) and not cls._NON_DETERMINISTIC.search(sql)
+
+    def _current_versions(self):
+        """Return table versions, reloading them at most once every `version_ttl` seconds.
+
+        The reload is an INFORMATION_SCHEMA query, so it runs outside the cache lock.
+        """
+        with self._lock:
+            if self._versions is not None and time.monotonic() - self._versions_loaded_at <= self.version_ttl:
+                return self._versions
+        versions = self.version_loader()
+        with self._lock:
+            self._versions = versions
+            self._versions_loaded_at = time.monotonic()
+        return versions
+
+    def snapshot(self):
+        """Return the table versions to tag a result with, or None if they can't be read.
+
+        Take it before the query runs: a write that lands mid-query then leaves the
+        entry tagged with the older version, so it is dropped instead of served stale.
+        """
+        try:
+            return self._current_versions()
+        except Exception:
+            return None
+
+    def _dependencies(self, key, versions):
+        """Map every known table mentioned in the SQL to its current version.
+
+        Returns None when nothing would invalidate the result: no known table is
+        mentioned, one of them is a view, or a table of another database is read.
+        """
+        for schema in self._QUALIFIED_TABLE.findall(key):
+            if self.database is None or schema.lower() != self.database.lower():
+                return None
+        words = {word.lower() for word in re.findall(r"\w+", key)}
+        dependencies = {table: version for table, version in versions.items() if table.lower() in words}
+        if not dependencies or any(version is None for version in dependencies.values()):
+            return None
+        return dependencies
+
+    def get(self, sql, window=None):
+        """Return the cached DataFrame for `sql` and row window, or None on a miss or stale entry."""
+        key = (self.normalize(sql), window)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+        versions = self.snapshot()
+        with self._lock:
+            if versions is None or self._entries.get(key) is not entry:
+                # Without a version signal we can't prove the entry is fresh
+                self.misses += 1
+                return None
+            if any(versions.get(table) != version for table, version in entry[2].items()):
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, sql, df, window, versions):
+        """Cache a result, evicting least recently used entries to stay under max_bytes.
+
+        `versions` is the snapshot() taken before the query ran; None skips caching.
+        """
+        nbytes = int(df.memory_usage(deep=True).sum())
+        if versions is None or nbytes > self.max_bytes:
+            return
+        key = (self.normalize(sql), window)
+        dependencies = self._dependencies(key[0], versions)
+        with self._lock:
+            if dependencies is None:
+                self.untracked += 1
+                return
+            self._remove(key)
+            self._entries[key] = (df, nbytes, dependencies)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """Drop every cached result and force a fresh version check."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+            self._versions = None
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def stats(self):
+        """Return counters for tuning the cache size."""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'untracked': self.untracked,
+            }
+
+class ResultExporter:
+    """Builds download files for query results on request and memoizes them on disk.
+
+    Files are written chunk by chunk into a private temp directory, keyed by
+    (result id, format), and evicted least recently used beyond max_bytes.
+    """
+
+    def __init__(self, instrumentation=None, max_bytes=EXPORT_CACHE_MAX_BYTES, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Create the export directory; it is removed when the exporter is collected or at exit."""
+        self.metrics = instrumentation or Instrumentation()
+        self.max_bytes = max_bytes
+        self.chunk_rows = chunk_rows
+        self.directory = tempfile.mkdtemp(prefix="sqlwizard-exports-")
+        self.bytes = 0
+        self._files = OrderedDict()  # (result_id, label) -> (path, nbytes)
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        weakref.finalize(self, shutil.rmtree, self.directory, True)
+
+    @staticmethod
+    def formats():
+        """Return the export format labels usable in this environment."""
+        has_pyarrow = importlib.util.find_spec("pyarrow") is not None
+        return [label for label, (_, _, needs_arrow) in EXPORT_FORMATS.items() if has_pyarrow or not needs_arrow]
+
+    def export(self, result_id, df, label):
+        """Return the path of `df` exported as `label`, writing it only on the first request."""
+        key = (result_id, label)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Concurrent clicks on the same download wait for one writer instead of racing
+        with key_lock:
+            with self._lock:
+                entry = self._files.get(key)
+                if entry is not None and os.path.exists(entry[0]):
+                    self._files.move_to_end(key)
+                    return entry[0]
+            extension = EXPORT_FORMATS[label][0]
+            path = os.path.join(self.directory, f"{uuid.uuid4().hex}.{extension}")
+            with self.metrics.span("export", rows=len(df), format=extension) as span:
+                self._write(df, path, extension)
+                nbytes = os.path.getsize(path)
+                span.set(bytes=nbytes)
+            with self._lock:
+                self._remove(key)
+                self._files[key] = (path, nbytes)
+                self.bytes += nbytes
+                while self.bytes > self.max_bytes and len(self._files) > 1:
+                    self._remove(next(iter(self._files)))
+            return path
+
+    def read(self, result_id, df, label):
+        """Return the export's bytes; used as a deferred st.download_button callable.
+
+        The file itself is written in chunks, but it can't be streamed to the browser:
+        Streamlit's media file manager converts whatever the callable returns (bytes or
+        a file object) into one in-memory bytes object and never closes a returned file.
+        Reading it here keeps that to a single copy without leaking a file handle.
+        """
+        with open(self.export(result_id, df, label), 'rb') as f:
+            return f.read()
+
+    def _write(self, df, path, extension):
+        """Serialize `df` to `path` in chunks of chunk_rows rows."""
+        chunks = range(0, max(len(df), 1), self.chunk_rows)
+        if extension in ("csv", "csv.gz"):
+            opener = gzip.open if extension == "csv.gz" else open
+            with opener(path, 'wt', newline='', encoding='utf-8') as f:
+                for start in chunks:
+                    df.iloc[start:start + self.chunk_rows].to_csv(f, index=False, header=start == 0)
+            return
+        import pyarrow as pa
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        if extension == "parquet":
+            import pyarrow.parquet as pq
+            writer = pq.ParquetWriter(path, schema)
+        else:
+            writer = pa.ipc.new_file(path, schema)
+        with writer:
+            for start in chunks:
+                chunk = df.iloc[start:start + self.chunk_rows]
+                writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+    def _remove(self, key):
+        entry = self._files.pop(key, None)
+        self._key_locks.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+            try:
+                os.remove(entry[0])
+            except OSError:
+                pass
+
+    def stats(self):
+        """Return counters for the sidebar."""
+        with self._lock:
+            return {'files': len(self._files), 'bytes': self.bytes, 'max_bytes': self.max_bytes}
+
+class ChatHistory(list):
+    """Session message list that keeps only the newest results in memory.
+
+    Result DataFrames of older messages are written to Parquet (pickle when
+    pyarrow can't represent them) in a per-session temp directory, which is
+    deleted when the history is garbage collected or the process exits.
+    """
+
+    _FRAMES = ("results", "full_results")
+
+    def __init__(self, messages=(), max_in_memory=HISTORY_RESULTS_IN_MEMORY):
+        """Create the spill directory and add the initial messages."""
+        super().__init__()
+        self.max_in_memory = max_in_memory
+        self.directory = tempfile.mkdtemp(prefix="sqlwizard-history-")
+        weakref.finalize(self, shutil.rmtree, self.directory, True)
+        for message in messages:
+            self.append(message)
+
+    def append(self, message):
+        """Add a message, spilling results that fall out of the in-memory window."""
+        super().append(message)
+        self.trim()
+
+    def trim(self):
+        """Spill every in-memory result except the newest max_in_memory."""
+        in_memory = [message for message in self if any(field in message for field in self._FRAMES)]
+        for message in in_memory[:max(len(in_memory) - self.max_in_memory, 0)]:
+            self.spill(message)
+
+    def spill(self, message):
+        """Move a message's DataFrames to disk, writing only those not already there."""
+        spilled = message.setdefault("spilled", {})
+        # Keep the export memo key stable across spill/load round trips
+        message.setdefault("result_id", uuid.uuid4().hex)
+        for field in self._FRAMES:
+            df = message.pop(field, None)
+            if isinstance(df, pd.DataFrame) and field not in spilled:
+                spilled[field] = (self._write(df), dict(df.attrs), len(df))
+
+    def load(self, message):
+        """Read a message's spilled DataFrames back into it."""
+        for field, (path, attrs, _) in message.get("spilled", {}).items():
+            if field not in message:
+                df = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+                df.attrs.update(attrs)
+                message[field] = df
+
+    def _write(self, df):
+        """Write a DataFrame into the spill directory and return its path."""
+        path = os.path.join(self.directory, uuid.uuid4().hex)
+        try:
+            df.to_parquet(f"{path}.parquet", index=False)
+            return f"{path}.parquet"
+        except Exception:
+            # No pyarrow, or a column type Parquet can't hold
+            if os.path.exists(f"{path}.parquet"):
+                os.remove(f"{path}.parquet")
+            df.to_pickle(f"{path}.pkl")
+            return f"{path}.pkl"
+
+class TokenBucket:
+    """Thread-safe token bucket that limits how often an action may start."""
+
+    def __init__(self, rate, capacity=None):
+        """Allow `rate` actions per second with bursts of up to `capacity`."""
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+def is_transient_error(error):
+    """Decide from its type and HTTP status whether a failed API call is worth retrying."""
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is not None:
+        return status in TRANSIENT_HTTP_STATUSES
+    if isinstance(error, requests.exceptions.RequestException):
+        # Invalid URLs, bad JSON and the like fail the same way every time
+        return isinstance(error, (
+            requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError
+        ))
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+def training_kwargs(example_type, content):
+    """Map a (type, content) training example to Vanna train() keyword arguments."""
+    if example_type == 'documentation':
+        return {'documentation': content}
+    if example_type == 'ddl':
+        return {'ddl': content}
+    if example_type == 'sql':
+        return {'sql': content}
+    if example_type == 'pair':
+        question, sql = content
+        return {'question': question, 'sql': sql}
+    raise ValueError(f"Unknown training example type: {example_type}")
+
+def training_pack_path(source_path):
+    """Return where the compiled pack of a training examples YAML file is stored."""
+    return f"{os.path.splitext(source_path)[0]}.pack.json"
+
+def read_training_pack(source_path, source):
+    """Return the examples compiled from `source` bytes if a current pack exists, else None."""
+    try:
+        with open(training_pack_path(source_path), 'r') as f:
+            pack = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if pack.get('version') != TRAINING_PACK_VERSION or pack.get('source_hash') != hashlib.sha256(source).hexdigest():
+        return None
+    return [(t, tuple(c) if t == 'pair' else c) for t, c in pack['examples']]
+
+def write_training_pack(source_path, source, examples):
+    """Atomically store parsed examples as JSON, keyed by the SHA-256 of the YAML bytes."""
+    pack = {
+        'version': TRAINING_PACK_VERSION,
+        'source_hash': hashlib.sha256(source).hexdigest(),
+        'examples': examples,
+    }
+    try:
+        tmp_path = f"{training_pack_path(source_path)}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(pack, f)
+        os.replace(tmp_path, training_pack_path(source_path))
+    except OSError:
+        # A read-only checkout just parses the YAML every time
+        pass
+
+class TrainingExecutor:
+    """Runs Vanna train() calls on a thread pool under a rate limit, retrying transient errors."""
+
+    def __init__(self, train_fn, concurrency=TRAINING_CONCURRENCY, rate=TRAINING_RATE_LIMIT,
+                 max_retries=TRAINING_MAX_RETRIES, backoff=TRAINING_RETRY_BACKOFF):
+        """Create an executor that sends examples through `train_fn(**kwargs)`."""
+        self.train_fn = train_fn
+        self.concurrency = concurrency
+        self.rate_limiter = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def _train_one(self, example_type, content):
+        """Train a single example and return its report entry."""
+        start = time.perf_counter()
+        attempts = 0
+        while True:
+            attempts += 1
+            self.rate_limiter.acquire()
+            try:
+                training_id = self.train_fn(**training_kwargs(example_type, content))
+                return {'type': example_type, 'status': 'ok', 'id': training_id, 'attempts': attempts,
+                        'seconds': time.perf_counter() - start, 'error': None}
+            except Exception as e:
+                if attempts > self.max_retries or not is_transient_error(e):
+                    return {'type': example_type, 'status': 'failed', 'id': None, 'attempts': attempts,
+                            'seconds': time.perf_counter() - start, 'error': str(e)}
+                time.sleep(self.backoff * 2 ** (attempts - 1))
+
+    def run(self, examples):
+        """Train all (type, content) examples concurrently; return reports in input order."""
+        if not examples:
+            return []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sqlwizard-train") as pool:
+            return list(pool.map(lambda example: self._train_one(*example), examples))
+
+class SchemaCatalog:
+    """In-memory snapshot of the database schema.
+
+    Built from one bulk query each on INFORMATION_SCHEMA COLUMNS, TABLES and
+    KEY_COLUMN_USAGE, so introspection cost doesn't grow with the table count.
+    """
+
+    FINGERPRINT_QUERY = """
+    SELECT
+        DATABASE(),
+        (SELECT COUNT(*) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE()),
+        (SELECT MAX(CREATE_TIME) FROM INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = DATABASE()),
+        COUNT(*),
+        SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, IS_NULLABLE, COLUMN_KEY)))
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    """
+    COLUMNS_QUERY = """
+    SELECT
+        TABLE_NAME,
+        COLUMN_NAME,
+        ORDINAL_POSITION,
+        COLUMN_TYPE,
+        IS_NULLABLE,
+        COLUMN_KEY,
+        COLUMN_DEFAULT,
+        EXTRA,
+        COLUMN_COMMENT
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """
+    TABLES_QUERY = """
+    SELECT
+        TABLE_NAME,
+        TABLE_TYPE,
+        ENGINE,
+        TABLE_ROWS,
+        CREATE_TIME,
+        UPDATE_TIME,
+        TABLE_COMMENT
+    FROM INFORMATION_SCHEMA.TABLES
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME
+    """
+    KEY_COLUMN_USAGE_QUERY = """
+    SELECT
+        TABLE_NAME,
+        COLUMN_NAME,
+        CONSTRAINT_NAME,
+        ORDINAL_POSITION,
+        REFERENCED_TABLE_NAME,
+        REFERENCED_COLUMN_NAME
+    FROM INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE()
+    ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+    """
+
+    def __init__(self, database, columns, tables, key_usage, fingerprint):
+        """Wrap already-loaded INFORMATION_SCHEMA DataFrames."""
+        self.database = database
+        self.columns = columns
+        self.tables = tables
+        self.key_usage = key_usage
+        self.fingerprint = fingerprint
+        self.loaded_at = datetime.now()
+        self._columns_by_table = {name: group for name, group in columns.groupby('TABLE_NAME', sort=False)}
+        self._hash = None
+        self._column_map = None
+
+    @staticmethod
+    def read_fingerprint(conn):
+        """Return the cheap schema fingerprint (database, table count, newest table, column count/checksum)."""
+        row = conn.execute(sqlalchemy.text(SchemaCatalog.FINGERPRINT_QUERY)).fetchone()
+        return tuple(str(value) for value in row)
+
+    @classmethod
+    def load(cls, conn, fingerprint=None):
+        """Build a catalog with one bulk query per INFORMATION_SCHEMA view."""
+        if fingerprint is None:
+            fingerprint = cls.read_fingerprint(conn)
+        return cls(
+            database=fingerprint[0],
+            columns=pd.read_sql(sqlalchemy.text(cls.COLUMNS_QUERY), conn),
+            tables=pd.read_sql(sqlalchemy.text(cls.TABLES_QUERY), conn),
+            key_usage=pd.read_sql(sqlalchemy.text(cls.KEY_COLUMN_USAGE_QUERY), conn),
+            fingerprint=fingerprint,
+        )
+
+    def table_names(self):
+        """Return all table and view names in the database."""
+        return self.tables['TABLE_NAME'].tolist()
+
+    def has_table(self, table):
+        """Return True if the table exists."""
+        return table in self._columns_by_table
+
+    def table_columns(self, table):
+        """Return the INFORMATION_SCHEMA.COLUMNS rows of one table, in ordinal order."""
+        return self._columns_by_table.get(table, self.columns.iloc[0:0])
+
+    def foreign_keys(self):
+        """Return KEY_COLUMN_USAGE rows that reference another table."""
+        return self.key_usage[self.key_usage['REFERENCED_TABLE_NAME'].notna()]
+
+    def schema_hash(self):
+        """Hash the column definitions so schema changes can be detected."""
+        if self._hash is None:
+            df_schema = (
+                self.columns[['TABLE_NAME', 'COLUMN_NAME', 'COLUMN_TYPE', 'IS_NULLABLE', 'COLUMN_KEY']]
+                .sort_values(['TABLE_NAME', 'COLUMN_NAME'])
+                .reset_index(drop=True)
+            )
+            self._hash = hashlib.md5(df_schema.to_json().encode()).hexdigest()
+        return self._hash
+
+    def create_table_sql(self, table):
+        """Rebuild a CREATE TABLE statement for a table from the catalog."""
+        lines = []
+        for _, col in self.table_columns(table).iterrows():
+            line = f"  `{col['COLUMN_NAME']}` {col['COLUMN_TYPE']}"
+            if col['IS_NULLABLE'] == 'NO':
+                line += " NOT NULL"
+            if col['COLUMN_DEFAULT'] is not None and not pd.isna(col['COLUMN_DEFAULT']):
+                line += f" DEFAULT {col['COLUMN_DEFAULT']}"
+            if col['EXTRA']:
+                line += f" {col['EXTRA']}"
+            lines.append(line)
+        keys = self.key_usage[self.key_usage['TABLE_NAME'] == table]
+        primary = keys[keys['CONSTRAINT_NAME'] == 'PRIMARY']['COLUMN_NAME'].tolist()
+        if primary:
+            lines.append(f"  PRIMARY KEY ({', '.join(f'`{c}`' for c in primary)})")
+        for _, fk in keys[keys['REFERENCED_TABLE_NAME'].notna()].iterrows():
+            lines.append(
+                f"  FOREIGN KEY (`{fk['COLUMN_NAME']}`) "
+                f"REFERENCES `{fk['REFERENCED_TABLE_NAME']}` (`{fk['REFERENCED_COLUMN_NAME']}`)"
+            )
+        return f"CREATE TABLE `{table}` (\n" + ",\n".join(lines) + "\n);"
+
+    def column_map(self):
+        """Return {table: {column: type}} with lower-cased names, as sqlglot expects a schema."""
+        if self._column_map is None:
+            column_map = defaultdict(dict)
+            for table, column in zip(self.columns['TABLE_NAME'].str.lower(), self.columns['COLUMN_NAME'].str.lower()):
+                # Types only matter to sqlglot for star expansion, so a placeholder is enough
+                column_map[table][column] = "TEXT"
+            self._column_map = dict(column_map)
+        return self._column_map
+
+def build_schema_training_items(columns, foreign_keys):
+    """Build per-table DDL and foreign-key documentation in one vectorized pass.
+
+    `columns` holds INFORMATION_SCHEMA.COLUMNS rows and `foreign_keys` the
+    KEY_COLUMN_USAGE rows that reference another table. Returns
+    {table: [(type, content), ...]} ready for the training executor.
+    """
+    if 'ORDINAL_POSITION' in columns:
+        columns = columns.sort_values(['TABLE_NAME', 'ORDINAL_POSITION'], kind='stable')
+    comments = columns['COLUMN_COMMENT'].fillna('') if 'COLUMN_COMMENT' in columns else None
+
+    # Column definitions for every table at once, then joined per table
+    lines = "  " + columns['COLUMN_NAME'] + " " + columns['COLUMN_TYPE']
+    lines += columns['IS_NULLABLE'].eq('NO').map({True: " NOT NULL", False: ""})
+    lines += columns['COLUMN_KEY'].eq('PRI').map({True: " PRIMARY KEY", False: ""})
+    if comments is not None:
+        lines += comments.where(comments == '', " COMMENT '" + comments.str.replace("'", "''") + "'")
+    bodies = lines.groupby(columns['TABLE_NAME'], sort=False).agg(",\n".join)
+    ddls = "CREATE TABLE " + bodies.index.to_series() + " (\n" + bodies + "\n);"
+
+    # Relationship docs straight from the declared foreign keys
+    docs = {}
+    if not foreign_keys.empty:
+        relations = (
+            foreign_keys['COLUMN_NAME'] + " references "
+            + foreign_keys['REFERENCED_TABLE_NAME'] + "." + foreign_keys['REFERENCED_COLUMN_NAME']
+        )
+        relations += (foreign_keys['TABLE_NAME'] == foreign_keys['REFERENCED_TABLE_NAME']).map(
+            {True: " (a self-reference, e.g. to a manager or parent row)", False: ""}
+        )
+        joined = relations.groupby(foreign_keys['TABLE_NAME'], sort=False).agg("; ".join)
+        docs = ("In the " + joined.index.to_series() + " table, " + joined + ".").to_dict()
+
+    items = {}
+    for table_name, ddl in ddls.items():
+        items[table_name] = [('ddl', ddl)]
+        if table_name in docs:
+            items[table_name].append(('documentation', docs[table_name]))
+    return items
+
+def find_schema_errors(sql, column_map, database=None):
+    """Check a SELECT's table and column references against `column_map` without the database.
+
+    Returns a list of {'kind': 'table' | 'column', 'name', 'message'} dicts. SQL that
+    sqlglot can't parse, or that reads other schemas, is left for MySQL to judge.
+    """
+    import sqlglot
+    from sqlglot import exp
+    from sqlglot.errors import OptimizeError, SqlglotError
+    from sqlglot.optimizer.qualify import qualify
+
+    try:
+        expression = sqlglot.parse_one(sql, read="mysql")
+    except SqlglotError:
+        return []
+    # MySQL column names are case-insensitive; compare everything lower-cased
+    for identifier in expression.find_all(exp.Identifier):
+        identifier.set('this', identifier.this.lower())
+
+    ctes = {cte.alias_or_name for cte in expression.find_all(exp.CTE)}
+    errors = []
+    for table in expression.find_all(exp.Table):
+        if table.db and table.db != (database or "").lower():
+            return []
+        if table.name and table.name not in column_map and table.name not in ctes:
+            errors.append({'kind': 'table', 'name': table.name, 'message': f"Unknown table '{table.name}'"})
+    if errors:
+        return errors
+
+    try:
+        qualify(expression, schema=column_map, dialect="mysql", validate_qualify_columns=True)
+    except OptimizeError as e:
+        message = str(e).split(". Line:")[0]
+        name = re.search(r"Column '([^']+)'|Unknown column: (\S+)", message)
+        errors.append({
+            'kind': 'column',
+            'name': next((group for group in name.groups() if group), None) if name else None,
+            'message': message,
+        })
+    except SqlglotError:
+        # Anything sqlglot can't reason about is not a reason to block the query
+        pass
+    return errors
+
+class SQLValidationError(Exception):
+    """Raised when generated SQL references tables or columns that don't exist."""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(error['message'] for error in errors))
+        self.errors = errors
+
+_TRAILING_LIMIT = re.compile(r"\bLIMIT\s+\d+(\s*(,|OFFSET)\s*\d+)?\s*;?\s*$", re.IGNORECASE)
+_TRAILING_COMMENT = re.compile(r"(?:--(?:\s[^\n'\"`]*)?|#[^\n'\"`]*|/\*[^'\"`]*?\*/)\s*\Z")
+_LOCKING_CLAUSE = re.compile(
+    r"\s(?:FOR\s+(?:UPDATE|SHARE)(?:\s+OF\s+[\w`.,\s]+?)?(?:\s+(?:NOWAIT|SKIP\s+LOCKED))?|LOCK\s+IN\s+SHARE\s+MODE)\s*\Z",
+    re.IGNORECASE,
+)
+
+def strip_statement_tail(sql):
+    """Drop trailing semicolons and comments so a clause can be appended to the statement."""
+    body = sql.strip()
+    while True:
+        stripped = _TRAILING_COMMENT.sub("", body).rstrip().rstrip(';').rstrip()
+        if stripped == body:
+            return body
+        body = stripped
+
+def add_limit(sql, limit):
+    """Append LIMIT to a statement, or None if it already ends in one.
+
+    The LIMIT goes before a trailing locking clause (FOR UPDATE, LOCK IN SHARE MODE),
+    which MySQL only accepts last.
+    """
+    body = strip_statement_tail(sql)
+    lock = _LOCKING_CLAUSE.search(body)
+    head, tail = (body[:lock.start()], body[lock.start():]) if lock else (body, "")
+    if _TRAILING_LIMIT.search(head):
+        return None
+    return f"{head}\nLIMIT {limit}{tail}"
+
+def analyze_explain(plan):
+    """Summarize an EXPLAIN FORMAT=JSON plan.
+
+    Returns estimated rows examined (prefix rows x rows per scan, summed over
+    every nested loop), the query cost, tables read with full scans and join
+    steps that have no join condition at all (cartesian products).
+    """
+    summary = {'estimated_rows': 0.0, 'cost': 0.0, 'full_scans': [], 'cartesian': []}
+
+    def table_step(table, prefix_rows):
+        rows = float(table.get('rows_examined_per_scan', 0) or 0)
+        summary['estimated_rows'] += prefix_rows * rows
+        if table.get('access_type') == 'ALL':
+            summary['full_scans'].append((table.get('table_name'), rows))
+            if prefix_rows > 1 and table.get('using_join_buffer') and 'attached_condition' not in table:
+                summary['cartesian'].append((table.get('table_name'), prefix_rows * rows))
+        produced = float(table.get('rows_produced_per_join', rows) or 0)
+        return produced or prefix_rows
+
+    def walk(node, prefix_rows=1.0):
+        if isinstance(node, list):
+            for item in node:
+                walk(item, prefix_rows)
+            return
+        if not isinstance(node, dict):
+            return
+        cost = node.get('cost_info', {}).get('query_cost')
+        if cost is not None:
+            summary['cost'] = max(summary['cost'], float(cost))
+        for key, value in node.items():
+            if key == 'nested_loop':
+                loop_rows = prefix_rows
+                for step in value:
+                    if 'table' in step:
+                        loop_rows = table_step(step['table'], loop_rows)
+                        walk({k: v for k, v in step['table'].items() if k != 'table_name'}, loop_rows)
+                    else:
+                        walk(step, loop_rows)
+            elif key == 'table' and isinstance(value, dict):
+                table_step(value, prefix_rows)
+                walk({k: v for k, v in value.items() if k != 'table_name'}, prefix_rows)
+            elif isinstance(value, (dict, list)):
+                walk(value, prefix_rows)
+
+    walk(plan)
+    return summary
+
+def decide_query_cost(sql, summary, thresholds=COST_GUARD):
+    """Turn an EXPLAIN summary into an allow/limit/confirm/reject decision."""
+    rows = summary['estimated_rows']
+    large = thresholds['large_table_rows']
+    large_scans = [name for name, scanned in summary['full_scans'] if scanned >= large]
+    cartesian = [name for name, produced in summary['cartesian'] if produced >= large]
+    decision = dict(summary, action='allow', sql=sql, reason=f"~{rows:,.0f} rows examined")
+
+    if rows >= thresholds['reject_rows'] or cartesian:
+        reason = f"cartesian join on {', '.join(cartesian)}" if cartesian else f"~{rows:,.0f} rows examined"
+        decision.update(action='reject', reason=reason)
+    elif rows >= thresholds['confirm_rows']:
+        decision.update(action='confirm', reason=f"~{rows:,.0f} rows examined")
+    elif rows >= thresholds['auto_limit_rows'] or large_scans:
+        limited = add_limit(sql, thresholds['auto_limit'])
+        if limited is not None:
+            reason = f"full scan of {', '.join(large_scans)}" if large_scans else f"~{rows:,.0f} rows examined"
+            decision.update(action='limit', sql=limited, reason=reason)
+    return decision
+
+class QueryCancelled(Exception):
+    """Raised when a running query was cancelled or hit its deadline."""
+
+class QueryHandle:
+    """A query running on the background pool, cancellable through its MySQL connection id."""
+
+    def __init__(self, sql, timeout, kill_fn):
+        """Track a submitted query and its deadline; `kill_fn(connection_id)` aborts it."""
+        self.sql = sql
+        self.timeout = timeout
+        self.kill_fn = kill_fn
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.connection_id = None
+        self.cancelled = False
+        self.timed_out = False
+        self.future = None
+        self.lock = threading.Lock()  # Guards connection_id against a KILL racing its release
+
+    def attach(self, connection_id):
+        """Record the MySQL connection the query runs on; raise if it was already cancelled."""
+        with self.lock:
+            self.connection_id = connection_id
+        if self.cancelled:
+            raise QueryCancelled("Query cancelled before it started")
+
+    def detach(self):
+        """Forget the connection before it goes back to the pool, so no KILL can reach its next user."""
+        with self.lock:
+            self.connection_id = None
+
+    def elapsed(self):
+        """Seconds the query has been running, or ran for once it finished."""
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def done(self):
+        """Return True once the query finished, failed or was cancelled."""
+        return self.future.done()
+
+    def result(self):
+        """Return the query's DataFrame, raising QueryCancelled if it was stopped."""
+        try:
+            return self.future.result()
+        except Exception as e:
+            if self.timed_out:
+                raise QueryCancelled(f"Query exceeded the {self.timeout}s time limit and was stopped") from e
+            if self.cancelled:
+                raise QueryCancelled("Query cancelled") from e
+            raise
+
+class QueryRunner:
+    """Runs queries on a bounded worker pool with per-query deadlines and cancellation.
+
+    One runner can be shared by the assistants of several databases, so the
+    admission limit holds for all of them together.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_QUERIES):
+        """Create the pool and its admission slots."""
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sqlwizard-query")
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def submit(self, fn, sql, kill_fn, timeout=QUERY_TIMEOUT):
+        """Run `fn(handle)` in the background; returns None when no slot is free.
+
+        `kill_fn(connection_id)` aborts the statement on the database it runs against.
+        """
+        if not self._slots.acquire(blocking=False):
+            return None
+        handle = QueryHandle(sql, timeout, kill_fn)
+        # Enforce the deadline even if nobody is waiting on the result anymore
+        timer = threading.Timer(timeout, self._expire, args=(handle,))
+        timer.daemon = True
+
+        def _run():
+            try:
+                return fn(handle)
+            finally:
+                handle.finished_at = time.monotonic()
+                timer.cancel()
+                self._slots.release()
+
+        handle.future = self._pool.submit(_run)
+        timer.start()
+        return handle
+
+    def _expire(self, handle):
+        handle.timed_out = True
+        self.cancel(handle)
+
+    def cancel(self, handle):
+        """Stop a running query with KILL QUERY on its connection."""
+        handle.cancelled = True
+        # Holding the lock keeps the connection from being released mid-KILL
+        with handle.lock:
+            if handle.connection_id is not None:
+                try:
+                    handle.kill_fn(handle.connection_id)
+                except Exception:
+                    # The query may have finished in the meantime
+                    pass
+
+    def shutdown(self):
+        """Stop the worker pool; queries already running are left to finish."""
+        self._pool.shutdown(wait=False)
+
+class _NoopSpan:
+    """Span returned when instrumentation is disabled; does nothing."""
+
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class _Span:
+    """Times one pipeline stage and hands the record to the instrumentation sinks."""
+
+    enabled = True
+
+    def __init__(self, instrumentation, name, attrs):
+        self.instrumentation = instrumentation
+        self.record = {'stage': name, **attrs}
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.record['seconds'] = time.perf_counter() - self._start
+        self.record['error'] = exc_type.__name__ if exc_type else None
+        self.record['timestamp'] = time.time()
+        self.instrumentation.emit(self.record)
+        return False
+
+    def set(self, **attrs):
+        """Attach attributes such as row counts or result bytes to the span."""
+        self.record.update(attrs)
+
+class Instrumentation:
+    """Collects per-stage timing spans and fans them out to pluggable sinks.
+
+    With no sinks, span() returns a shared no-op object so disabled
+    instrumentation costs one attribute check per stage.
+    """
+
+    def __init__(self, sinks=()):
+        """Create the instrumentation with the given sink objects."""
+        self.sinks = list(sinks)
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def span(self, name, **attrs):
+        """Return a context manager timing the named stage."""
+        if not self.sinks:
+            return _NOOP_SPAN
+        return _Span(self, name, attrs)
+
+    def observe(self, name, seconds, **attrs):
+        """Record a stage that was timed elsewhere."""
+        if self.sinks:
+            self.emit({'stage': name, **attrs, 'seconds': seconds, 'error': None, 'timestamp': time.time()})
+
+    def emit(self, record):
+        """Send a finished span record to every sink."""
+        for sink in self.sinks:
+            try:
+                sink.record(record)
+            except Exception:
+                # A broken sink must never break the chat
+                pass
+
+    def get_sink(self, name):
+        """Return the first sink with the given name ("json", "prometheus" or "panel"), if configured."""
+        return next((sink for sink in self.sinks if getattr(sink, 'name', None) == name), None)
+
+class JsonLogSink:
+    """Writes every span as one structured JSON log line."""
+
+    name = "json"
+
+    def __init__(self, logger_name="sqlwizard.metrics"):
+        self.logger = logging.getLogger(logger_name)
+        if not self.logger.handlers:
+            handler = logging.StreamHandler()
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    def record(self, record):
+        self.logger.info(json.dumps(record, default=str))
+
+class PrometheusSink:
+    """Aggregates spans into histograms served in the Prometheus text format."""
+
+    name = "prometheus"
+
+    def __init__(self, buckets=METRICS_BUCKETS):
+        self.buckets = buckets
+        self._stages = {}  # stage -> {'counts': [...], 'sum', 'count', 'errors', 'rows', 'bytes'}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def record(self, record):
+        seconds = record['seconds']
+        with self._lock:
+            stage = self._stages.setdefault(record['stage'], {
+                'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0, 'errors': 0, 'rows': 0, 'bytes': 0
+            })
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    stage['counts'][i] += 1
+            stage['sum'] += seconds
+            stage['count'] += 1
+            stage['errors'] += 1 if record.get('error') else 0
+            stage['rows'] += record.get('rows') or 0
+            stage['bytes'] += record.get('bytes') or 0
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP sqlwizard_stage_seconds Time spent in each chat pipeline stage.",
+            "# TYPE sqlwizard_stage_seconds histogram",
+        ]
+        with self._lock:
+            stages = {name: dict(stage, counts=list(stage['counts'])) for name, stage in self._stages.items()}
+        for name, stage in sorted(stages.items()):
+            for bound, count in zip(self.buckets, stage['counts']):
+                lines.append(f'sqlwizard_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'sqlwizard_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'sqlwizard_stage_seconds_sum{{stage="{name}"}} {stage["sum"]}')
+            lines.append(f'sqlwizard_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+        for metric, key, help_text in (
+            ("sqlwizard_stage_errors_total", "errors", "Stage executions that raised."),
+            ("sqlwizard_result_rows_total", "rows", "Rows produced per stage."),
+            ("sqlwizard_result_bytes_total", "bytes", "Result bytes produced per stage."),
+        ):
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            lines += [f'{metric}{{stage="{name}"}} {stage[key]}' for name, stage in sorted(stages.items())]
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port=METRICS_PORT, host=METRICS_HOST):
+        """Serve /metrics on a background thread.
+
+        A server already started in this process for the same address (for example
+        by a sink Streamlit's "Clear cache" dropped) is switched over to this sink.
+        If the port is taken by anything else, the endpoint is skipped with a warning.
+        """
+        thread_name = f"sqlwizard-metrics-{host}:{port}"
+        for thread in threading.enumerate():
+            server = getattr(thread, 'metrics_server', None)
+            if thread.name == thread_name and server is not None:
+                server.sink = self
+                self._server = server
+                return
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = self.server.sink.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            server = ThreadingHTTPServer((host, port), _Handler)
+        except OSError as e:
+            logging.getLogger("sqlwizard").warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+            return
+        server.sink = self
+        thread = threading.Thread(target=server.serve_forever, name=thread_name, daemon=True)
+        thread.metrics_server = server
+        thread.start()
+        self._server = server
+
+class PanelSink:
+    """Keeps recent spans in memory for the in-app performance panel."""
+
+    name = "panel"
+
+    def __init__(self, max_records=1000):
+        self._records = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, record):
+        with self._lock:
+            self._records.append(record)
+
+    def summary(self):
+        """Return per-stage latency percentiles and totals as a DataFrame."""
+        with self._lock:
+            records = list(self._records)
+        if not records:
+            return pd.DataFrame()
+        df = pd.DataFrame(records)
+        for column in ('rows', 'bytes'):
+            df[column] = df[column].fillna(0).astype('int64') if column in df else 0
+        grouped = df.groupby('stage')
+        return pd.DataFrame({
+            'count': grouped['seconds'].count(),
+            'p50_ms': grouped['seconds'].quantile(0.5) * 1000,
+            'p95_ms': grouped['seconds'].quantile(0.95) * 1000,
+            'last_ms': grouped['seconds'].last() * 1000,
+            'rows': grouped['rows'].sum(),
+            'bytes': grouped['bytes'].sum(),
+        }).round(1)
+
+def timed(stage):
+    """Decorator timing a SQLAssistant method as a span on its instrumentation."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.span(stage):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def build_instrumentation(sink_names=METRICS_SINKS):
+    """Create Instrumentation with the sinks named in METRICS_SINKS."""
+    sinks = []
+    for name in sink_names:
+        if name == 'json':
+            sinks.append(JsonLogSink())
+        elif name == 'prometheus':
+            sink = PrometheusSink()
+            sink.serve()
+            sinks.append(sink)
+        elif name == 'panel':
+            sinks.append(PanelSink())
+        else:
+            raise ValueError(f"Unknown metrics sink: {name}")
+    return Instrumentation(sinks)
+
+class PoolMetrics:
+    """Collects checkout, wait time and overflow statistics for a SQLAlchemy pool."""
+
+    def __init__(self, engine):
+        """Attach pool event listeners to the engine."""
+        self.engine = engine
+        self.checkouts = 0
+        self.connects = 0
+        self.open_connections = 0
+        self.invalidations = 0
+        self.overflow_events = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._lock = threading.Lock()
+        sqlalchemy.event.listen(engine, 'checkout', self._on_checkout)
+        sqlalchemy.event.listen(engine, 'connect', self._on_connect)
+        sqlalchemy.event.listen(engine, 'close', self._on_close)
+        sqlalchemy.event.listen(engine, 'invalidate', self._on_invalidate)
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        pool = self.engine.pool
+        with self._lock:
+            self.connects += 1
+            self.open_connections += 1
+            # Opening more connections than pool_size means we dipped into max_overflow
+            if hasattr(pool, 'size') and self.open_connections > pool.size():
+                self.overflow_events += 1
+
+    def _on_close(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.open_connections -= 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def record_wait(self, seconds):
+        """Record how long a caller waited to check out a connection."""
+        with self._lock:
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+
+    def snapshot(self):
+        """Return current pool usage and cumulative counters."""
+        pool = self.engine.pool
+        with self._lock:
+            return {
+                'size': pool.size() if hasattr(pool, 'size') else None,
+                'checked_out': pool.checkedout() if hasattr(pool, 'checkedout') else None,
+                'overflow': pool.overflow() if hasattr(pool, 'overflow') else None,
+                'checkouts': self.checkouts,
+                'connects': self.connects,
+                'open_connections': self.open_connections,
+                'overflow_events': self.overflow_events,
+                'invalidations': self.invalidations,
+                'avg_wait_ms': 1000 * self.total_wait / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': 1000 * self.max_wait,
+            }
+
+class AssistantRegistry:
+    """Creates one assistant per database on first use and releases idle ones.
+
+    Only databases somebody actually queries pay for an engine, schema catalog,
+    training sync and caches; one left unused for `idle_timeout` seconds is
+    closed and recreated on its next use.
+    """
+
+    def __init__(self, factory, idle_timeout=DATABASE_IDLE_TIMEOUT):
+        """`factory(name, query_runner)` returns a ready assistant for the database, or None on failure.
+
+        Every assistant gets the registry's query runner, so MAX_CONCURRENT_QUERIES
+        bounds all databases together.
+        """
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.query_runner = QueryRunner()
+        self.evictions = 0
+        self._assistants = {}  # name -> assistant
+        self._last_used = {}  # name -> monotonic time of the last get()
+        self._name_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """Return the assistant for `name`, creating it if needed; None if setup fails."""
+        with self._lock:
+            name_lock = self._name_locks.setdefault(name, threading.Lock())
+        # Sessions asking for the same cold database wait for one setup instead of racing
+        with name_lock:
+            with self._lock:
+                assistant = self._assistants.get(name)
+            if assistant is None:
+                assistant = self.factory(name, self.query_runner)
+                if assistant is None:
+                    return None
+            with self._lock:
+                self._assistants[name] = assistant
+                self._last_used[name] = time.monotonic()
+        self.evict_idle()
+        return assistant
+
+    def is_loaded(self, name):
+        """Return True if the database's assistant is already set up."""
+        with self._lock:
+            return name in self._assistants
+
+    def evict_idle(self):
+        """Close every assistant that has not been used for idle_timeout seconds."""
+        now = time.monotonic()
+        with self._lock:
+            idle = [name for name, used in self._last_used.items() if now - used > self.idle_timeout]
+            evicted = [self._assistants.pop(name) for name in idle]
+            for name in idle:
+                del self._last_used[name]
+            self.evictions += len(evicted)
+        for assistant in evicted:
+            assistant.close()
+
+    def stats(self):
+        """Return the loaded databases and how long each has been idle."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                'loaded': {name: round(now - used, 1) for name, used in self._last_used.items()},
+                'evictions': self.evictions,
+            }
 
 class SQLAssistant(VannaDefault):
     """SQL Assistant that handles database operations and natural language processing."""
     
-    def __init__(self, api_key):
-        """Initialize the SQL Assistant with API key and setup state tracking."""
-        super().__init__(model=MODEL_NAME, api_key=api_key)
+    def __init__(self, api_key, instrumentation=None, database=None, query_runner=None):
+        """Initialize the SQL Assistant for one database in DATABASES (the default if None).
+
+        Pass a shared `query_runner` to bound concurrent queries across databases;
+        without one the assistant runs its own and shuts it down on close().
+        """
+        self.settings = database_settings(database)
+        self.database = self.settings['dbname']
+        super().__init__(model=self.settings['model'], api_key=api_key)
+        self.metrics = instrumentation or Instrumentation()
         self.engine = None
+        self.pool_metrics = None
         self._schema = None
-        self.model_state_file = "model_state.json"
-        self.training_data_file = "training_data.json"
-        self.examples_file = "training_examples.yaml"
+        self.model_state_file = self.settings['model_state_file']
+        self.training_data_file = self.settings['training_data_file']
+        self.examples_file = self.settings['examples_file']
         self._training_examples = []
+        self._schema_hash = None
+        self._catalog = None
+        self._catalog_checked_at = 0
+        self._catalog_lock = threading.Lock()
+        self.question_cache = QuestionCache(path=self.settings['question_cache_file'])
+        self.question_index = QuestionIndex(threshold=RETRIEVAL_THRESHOLD)
+        self.result_cache = ResultCache(self._get_table_versions, database=self.database)
+        self._owns_query_runner = query_runner is None
+        self.query_runner = query_runner or QueryRunner()
+        self._plan_cache = OrderedDict()  # normalized SQL -> EXPLAIN summary
+        self._plan_cache_lock = threading.Lock()
+        self._sqlglot_available = importlib.util.find_spec("sqlglot") is not None
+        self.validation_stats = {'checked': 0, 'round_trips_avoided': 0, 'regenerations': 0, 'fixed_by_regeneration': 0}
+        self._validation_lock = threading.Lock()
+        self.training_executor = TrainingExecutor(self._timed_train)
+        self.last_training_report = []
+        self._example_hashes = {}  # content hash -> Vanna training id
+        self._table_hashes = {}  # table -> {'hash': ..., 'items': {content hash -> training id}}
+        self._schema_changed = True
+        self._schema_training_complete = False
+        self.startup_seconds = None
+        self.healthy = False
+        self.last_health_check = None
+        self._health_stop = threading.Event()
+        self._health_thread = None
+        self._schema_stop = threading.Event()
+        self._schema_thread = None
+        self._schema_sync_lock = threading.Lock()
+        self.schema_changes = 0
+        self.last_schema_change = None
         
+    @contextmanager
+    def _connect(self):
+        """Check out a connection from the shared pool, recording the wait time."""
+        start = time.perf_counter()
+        conn = self.engine.connect()
+        if self.pool_metrics is not None:
+            self.pool_metrics.record_wait(time.perf_counter() - start)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _run_sql_pooled(self, sql):
+        """Vanna run_sql hook backed by the shared connection pool."""
+        with self._connect() as conn:
+            return pd.read_sql_query(sqlalchemy.text(sql), conn)
+
+    def get_catalog(self, force=False, recheck=False):
+        """Return the schema catalog, rebuilding it only when the cheap fingerprint changed.
+
+        The fingerprint itself is re-read at most once every SCHEMA_CHECK_INTERVAL seconds,
+        or, while the schema watcher runs, only when it asks with `recheck`.
+        """
+        with self._catalog_lock:
+            now = time.monotonic()
+            interval = float('inf') if self.schema_watcher_running() else SCHEMA_CHECK_INTERVAL
+            if not (force or recheck) and self._catalog is not None and now - self._catalog_checked_at < interval:
+                return self._catalog
+            with self._connect() as conn:
+                fingerprint = SchemaCatalog.read_fingerprint(conn)
+                if force or self._catalog is None or self._catalog.fingerprint != fingerprint:
+                    with self.metrics.span("schema_catalog"):
+                        self._catalog = SchemaCatalog.load(conn, fingerprint)
+                    with self._plan_cache_lock:
+                        self._plan_cache.clear()
+            self._catalog_checked_at = now
+            return self._catalog
+
+    @timed("schema_hash")
     def _calculate_schema_hash(self):
         """Calculate a hash of the database schema to detect changes."""
         try:
-            with self.engine.connect() as conn:
-                schema_query = """
-                SELECT 
-                    TABLE_NAME, 
-                    COLUMN_NAME,
-                    COLUMN_TYPE,
-                    IS_NULLABLE,
-                    COLUMN_KEY
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_SCHEMA = 'company_v2'
-                ORDER BY TABLE_NAME, COLUMN_NAME
-                """
-                df_schema = pd.read_sql(schema_query, conn)
-                schema_str = df_schema.to_json()
-                return hashlib.md5(schema_str.encode()).hexdigest()
+            self._schema_hash = self.get_catalog().schema_hash()
+            return self._schema_hash
         except Exception as e:
-            st.error(f"Error calculating schema hash: {str(e)}")
+            notify("error", f"Error calculating schema hash: {str(e)}")
             return None
 
+    def _get_table_versions(self):
+        """Fetch a cheap per-table version signal used to invalidate cached results."""
+        with self._connect() as conn:
+            try:
+                # MySQL 8 caches these statistics for a day unless told otherwise
+                conn.execute(sqlalchemy.text("SET SESSION information_schema_stats_expiry = 0"))
+                expiry_changed = True
+            except Exception:
+                expiry_changed = False
+            try:
+                rows = conn.execute(sqlalchemy.text("""
+                    SELECT TABLE_NAME, UPDATE_TIME, TABLE_ROWS, TABLE_TYPE
+                    FROM INFORMATION_SCHEMA.TABLES
+                    WHERE TABLE_SCHEMA = DATABASE()
+                """)).fetchall()
+            finally:
+                if expiry_changed:
+                    # The connection goes back to the shared pool; don't leak the setting to its next user
+                    try:
+                        conn.execute(sqlalchemy.text("SET SESSION information_schema_stats_expiry = DEFAULT"))
+                    except Exception:
+                        conn.invalidate()
+        # Views have no UPDATE_TIME/TABLE_ROWS, so results reading them can't be invalidated
+        return {row[0]: None if row[3] == 'VIEW' else (str(row[1]), row[2]) for row in rows}
+
+    @staticmethod
+    def _content_hash(example_type, content):
+        """Hash a training example so unchanged examples can be skipped on retrain."""
+        return hashlib.sha256(json.dumps([example_type, content]).encode()).hexdigest()
+
+    @staticmethod
+    def _table_hash(item_hashes):
+        """Hash a table's training items so unchanged tables can be skipped as a whole."""
+        return hashlib.sha256("".join(sorted(item_hashes)).encode()).hexdigest()
+
     def _save_training_data(self):
-        """Save training data and schema hash to file."""
+        """Save training data, content hashes and schema hash to file."""
         try:
+            schema_hash = self._calculate_schema_hash()
             training_data = {
-                'schema_hash': self._calculate_schema_hash(),
+                # A partially trained schema is re-diffed on the next startup
+                'schema_hash': schema_hash if self._schema_training_complete else None,
                 'examples': self._training_examples,
+                'example_hashes': self._example_hashes,
+                'table_hashes': self._table_hashes,
                 'last_trained': datetime.now().isoformat()
             }
             with open(self.training_data_file, 'w') as f:
                 json.dump(training_data, f)
         except Exception as e:
-            st.error(f"Error saving training data: {str(e)}")
+            notify("error", f"Error saving training data: {str(e)}")
 
     def _load_training_data(self):
-        """Load training data and verify schema hasn't changed."""
+        """Load training data and content hashes, and note whether the schema has changed.
+
+        Returns False when there is nothing to diff against and a full retrain is needed.
+        """
         try:
             if not os.path.exists(self.training_data_file):
                 return False
@@ -82,15 +1746,22 @@ class SQLAssistant(VannaDefault):
             with open(self.training_data_file, 'r') as f:
                 training_data = json.load(f)
                 
-            current_hash = self._calculate_schema_hash()
-            if current_hash != training_data.get('schema_hash'):
-                st.warning("Database schema has changed. Retraining required.")
+            if 'example_hashes' not in training_data:
+                notify("warning", "Training data has no content hashes. Full retraining required.")
                 return False
+
+            current_hash = self._calculate_schema_hash()
+            self._schema_changed = current_hash is None or current_hash != training_data.get('schema_hash')
+            if self._schema_changed:
+                notify("warning", "Database schema has changed. Retraining changed tables.")
                 
             self._training_examples = training_data.get('examples', [])
+            self._example_hashes = training_data.get('example_hashes', {})
+            self._table_hashes = training_data.get('table_hashes', {})
+            self._schema_training_complete = not self._schema_changed
             return True
         except Exception as e:
-            st.error(f"Error loading training data: {str(e)}")
+            notify("error", f"Error loading training data: {str(e)}")
             return False
 
     def is_model_trained(self):
@@ -114,122 +1785,225 @@ class SQLAssistant(VannaDefault):
     def verify_schema(self):
         """Verify that we're connected to the correct database with the expected schema."""
         try:
-            with self.engine.connect() as conn:
-                # Check if we're connected to company_v2
-                result = conn.execute(text("SELECT DATABASE()")).fetchone()
-                if result[0] != 'company_v2':
-                    raise Exception("Connected to wrong database. Expected 'company_v2'")
-                
-                # Verify key tables exist
-                tables_to_check = [
-                    'departments',
-                    'employees',
-                    'job_grades',
-                    'projects',
-                    'skills',
-                    'performance_reviews'
-                ]
-                
-                for table in tables_to_check:
-                    result = conn.execute(text(f"SHOW TABLES LIKE '{table}'")).fetchone()
-                    if not result:
-                        raise Exception(f"Required table '{table}' not found")
-                
-                # Verify key columns in employees table
-                columns = conn.execute(text("SHOW COLUMNS FROM employees")).fetchall()
-                required_columns = ['emp_id', 'first_name', 'last_name', 'manager_id', 'dept_id', 'job_title']
-                column_names = [col[0] for col in columns]
-                
+            catalog = self.get_catalog()
+
+            # Check if we're connected to the configured database
+            if catalog.database != self.database:
+                raise Exception(f"Connected to wrong database. Expected '{self.database}'")
+            
+            # Verify key tables and columns exist
+            for table, required_columns in self.settings['required_columns'].items():
+                if not catalog.has_table(table):
+                    raise Exception(f"Required table '{table}' not found")
+                column_names = catalog.table_columns(table)['COLUMN_NAME'].tolist()
                 for col in required_columns:
                     if col not in column_names:
-                        raise Exception(f"Required column '{col}' not found in employees table")
-                
-                return True
+                        raise Exception(f"Required column '{col}' not found in {table} table")
+            
+            return True
                 
         except Exception as e:
-            st.error(f"Schema verification failed: {str(e)}")
+            notify("error", f"Schema verification failed: {str(e)}")
             return False
 
     def get_actual_schema(self):
         """Fetch and return the actual database schema."""
         try:
-            with self.engine.connect() as conn:
+            catalog = self.get_catalog()
+            with self._connect() as conn:
                 # Get table definitions
                 tables_info = {}
-                for table in ['departments', 'employees']:
+                for table in self.settings['required_columns']:
+                    if not catalog.has_table(table):
+                        continue
                     # Get table structure
-                    columns = conn.execute(text(f"SHOW CREATE TABLE {table}")).fetchone()[1]
-                    tables_info[table] = columns
+                    tables_info[table] = catalog.create_table_sql(table)
                     
                     # Get column information
-                    columns_query = f"""
-                    SELECT 
-                        COLUMN_NAME, 
-                        COLUMN_TYPE,
-                        IS_NULLABLE,
-                        COLUMN_KEY,
-                        COLUMN_DEFAULT,
-                        EXTRA
-                    FROM INFORMATION_SCHEMA.COLUMNS 
-                    WHERE TABLE_SCHEMA = 'company_v2' 
-                    AND TABLE_NAME = '{table}'
-                    ORDER BY ORDINAL_POSITION
-                    """
-                    columns_df = pd.read_sql(columns_query, conn)
+                    columns_df = catalog.table_columns(table)[
+                        ['COLUMN_NAME', 'COLUMN_TYPE', 'IS_NULLABLE', 'COLUMN_KEY', 'COLUMN_DEFAULT', 'EXTRA']
+                    ]
                     tables_info[f"{table}_columns"] = columns_df.to_dict('records')
                     
                     # Get sample data using pandas
-                    sample_df = pd.read_sql(f"SELECT * FROM {table} LIMIT 1", conn)
+                    sample_df = pd.read_sql(f"SELECT * FROM `{table}` LIMIT 1", conn)
                     if not sample_df.empty:
                         tables_info[f"{table}_sample"] = sample_df.to_dict('records')[0]
                 
                 return tables_info
         except Exception as e:
-            st.error(f"Error fetching schema: {str(e)}")
+            notify("error", f"Error fetching schema: {str(e)}")
             return None
 
+    @timed("setup_database")
     def setup_database(self):
         """Setup database connection and ensure model is trained."""
+        start = time.perf_counter()
         try:
-            connection_string = f"mysql+pymysql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['dbname']}"
-            self.engine = create_engine(connection_string)
+            config = self.settings
+            connection_string = f"mysql+pymysql://{config['user']}:{config['password']}@{config['host']}:{config['port']}/{config['dbname']}"
+            self.engine = sqlalchemy.create_engine(connection_string, **POOL_CONFIG)
+            self.pool_metrics = PoolMetrics(self.engine)
             
-            self.connect_to_mysql(**DB_CONFIG)
+            # Route Vanna's run_sql through the same pool instead of a second connection
+            self.dialect = "MySQL"
+            self.run_sql = self._run_sql_pooled
+            self.run_sql_is_set = True
             
             # Verify schema before proceeding
             if not self.verify_schema():
                 return False
             
-            with self.engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
+            with self._connect() as conn:
+                conn.execute(sqlalchemy.text("SELECT 1"))
                 conn.commit()
-                st.success("⚡ Database connected successfully!")
+                notify("success", "⚡ Database connected successfully!")
 
             # Check if we need to train
             if not self.is_model_trained() or not self._load_training_data():
-                st.info("🤖 Training model with examples...")
+                notify("info", "🤖 Training model with examples...")
                 if not self.train_model():
                     return False
                 self._save_training_data()
-                st.success("✨ Model trained successfully!")
+                notify("success", "✨ Model trained successfully!")
             else:
-                st.success("🎯 Using previously trained model")
+                changes = self.sync_training()
+                if changes:
+                    self.mark_model_trained()
+                    self._save_training_data()
+                    notify("success", f"🔄 Applied {changes} training updates")
+                else:
+                    notify("success", "🎯 Using previously trained model")
+            # Setup already synced; the watcher only needs to act on later changes
+            self._schema_changed = not self._schema_training_complete
             
+            self.healthy = True
+            self.last_health_check = datetime.now()
+            self.startup_seconds = time.perf_counter() - start
             return True
             
         except Exception as e:
-            st.error(f"❌ Setup failed: {str(e)}")
+            notify("error", f"❌ Setup failed: {str(e)}")
             return False
 
+    def check_health(self):
+        """Ping the database and record whether the shared connection pool is usable."""
+        try:
+            with self._connect() as conn:
+                conn.execute(sqlalchemy.text("SELECT 1"))
+            self.healthy = True
+        except Exception:
+            # Drop pooled connections so the next checkout reconnects from scratch
+            self.engine.dispose()
+            self.healthy = False
+        self.last_health_check = datetime.now()
+        return self.healthy
+
+    def start_health_check(self, interval=HEALTH_CHECK_INTERVAL):
+        """Run check_health on a background daemon thread every `interval` seconds."""
+        if self._health_thread is not None and self._health_thread.is_alive():
+            return
+
+        def _loop():
+            while not self._health_stop.wait(interval):
+                self.check_health()
+
+        self._health_stop.clear()
+        self._health_thread = threading.Thread(target=_loop, name="sqlwizard-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_check(self):
+        """Stop the background health check thread."""
+        self._health_stop.set()
+
+    def check_schema(self):
+        """Poll the schema fingerprint; if it moved, invalidate caches and resync training.
+
+        Runs on the schema watcher thread, so the full schema hash and any retraining
+        stay off the request path. Returns the number of training updates applied,
+        or None when the schema is unchanged.
+        """
+        with self._schema_sync_lock:
+            new_hash = self.get_catalog(recheck=True).schema_hash()
+            # A previous sync that didn't finish training every table is retried too
+            if new_hash == self._schema_hash and not self._schema_changed:
+                return None
+            if new_hash != self._schema_hash:
+                with self.metrics.span("schema_change"):
+                    self._schema_hash = new_hash
+                    self._schema_changed = True
+                    # Plans were dropped with the old catalog; results and answers go too
+                    self.result_cache.clear()
+                    self.question_cache.clear()
+                self.schema_changes += 1
+                self.last_schema_change = datetime.now()
+            changes = self.sync_training()
+            self._schema_changed = not self._schema_training_complete
+            if changes:
+                self.mark_model_trained()
+                self._save_training_data()
+            return changes
+
+    def _watch_schema(self):
+        """Schema watcher thread body; errors are logged and retried on the next poll."""
+        while not self._schema_stop.wait(self._schema_watch_interval):
+            try:
+                self.check_schema()
+            except Exception:
+                logging.getLogger("sqlwizard").exception("Schema check failed for %s", self.database)
+
+    def start_schema_watcher(self, interval=SCHEMA_WATCH_INTERVAL):
+        """Poll for schema changes on a background daemon thread every `interval` seconds."""
+        if self.schema_watcher_running():
+            return
+        self._schema_watch_interval = interval
+        self._schema_stop.clear()
+        self._schema_thread = threading.Thread(target=self._watch_schema, name="sqlwizard-schema", daemon=True)
+        self._schema_thread.start()
+
+    def stop_schema_watcher(self):
+        """Stop the background schema watcher; requests fall back to periodic fingerprint checks."""
+        self._schema_stop.set()
+        self._schema_thread = None
+
+    def schema_watcher_running(self):
+        """Return True while the background schema watcher is active."""
+        return self._schema_thread is not None and self._schema_thread.is_alive()
+
+    def close(self):
+        """Release the engine, caches and background threads of an evicted database.
+
+        A query runner shared through the registry outlives the assistant; one the
+        assistant created itself is shut down here.
+        """
+        self.stop_health_check()
+        self.stop_schema_watcher()
+        self.result_cache.clear()
+        with self._plan_cache_lock:
+            self._plan_cache.clear()
+        if self._owns_query_runner:
+            self.query_runner.shutdown()
+        if self.engine is not None:
+            self.engine.dispose()
+
     def _load_training_examples(self):
         """Load and process training examples from YAML file according to Vanna.ai format."""
         try:
+            if not self.examples_file:
+                # Databases without curated examples are trained on their schema only
+                return []
             if not os.path.exists(self.examples_file):
-                st.error(f"Training examples file not found: {self.examples_file}")
+                notify("error", f"Training examples file not found: {self.examples_file}")
                 return []
                 
-            with open(self.examples_file, 'r') as f:
-                data = yaml.safe_load(f)
+            with open(self.examples_file, 'rb') as f:
+                source = f.read()
+            examples = read_training_pack(self.examples_file, source)
+            if examples is not None:
+                return examples
+
+            import yaml
+            data = yaml.safe_load(source)
                 
             examples = []
             
@@ -253,60 +2027,97 @@ class SQLAssistant(VannaDefault):
                 for pair in category.get('pairs', []):
                     examples.append(('pair', (pair['question'], pair['sql'])))
             
+            write_training_pack(self.examples_file, source, examples)
             return examples
             
         except Exception as e:
-            st.error(f"Error loading training examples: {str(e)}")
+            notify("error", f"Error loading training examples: {str(e)}")
             return []
 
+    def _schema_training_items(self):
+        """Build DDL and relationship documentation examples from the live schema, per table."""
+        catalog = self.get_catalog()
+        return build_schema_training_items(catalog.columns, catalog.foreign_keys())
+
+    def _timed_train(self, **kwargs):
+        """Send one example to Vanna's train(), recording it as a span."""
+        with self.metrics.span("train", type=next(iter(kwargs), None)):
+            return self.train(**kwargs)
+
+    def _report_training(self, report):
+        """Surface a training report in the UI and keep it for later inspection."""
+        self.last_training_report = report
+        failures = [entry for entry in report if entry['status'] != 'ok']
+        for entry in failures:
+            notify("warning", f"Failed to train example type {entry['type']}. Error: {entry['error']}")
+        if report:
+            notify("info", f"📚 Trained {len(report) - len(failures)}/{len(report)} examples")
+        return failures
+
+    def _train_tracked(self, items):
+        """Train (hash, type, content) items and return {hash: training id} for those that succeeded."""
+        report = self.training_executor.run([(example_type, content) for _, example_type, content in items])
+        self._report_training(report)
+        return {
+            item[0]: entry['id']
+            for item, entry in zip(items, report)
+            if entry['status'] == 'ok'
+        }
+
+    def _train_schema_tables(self, tables, extra_items=()):
+        """Train changed items of the given {table: [(type, content)]} schema, plus extra items.
+
+        Tables whose content hash matches the stored one are skipped entirely; for the
+        rest only new or changed items are trained and stale ones are removed. Pass
+        tables=None to leave the schema untouched.
+        Returns ({table: [(hash, type, content)]} of pending items, trained ids, stale ids).
+        """
+        pending = {}
+        stale_ids = []
+        for table, table_items in (tables or {}).items():
+            hashed = {self._content_hash(t, c): (t, c) for t, c in table_items}
+            known = self._table_hashes.get(table, {})
+            if known.get('hash') == self._table_hash(hashed):
+                continue
+            known_items = known.get('items', {})
+            pending[table] = [(h, t, c) for h, (t, c) in hashed.items() if h not in known_items]
+            stale_ids += [training_id for h, training_id in known_items.items() if h not in hashed]
+        for table in set(self._table_hashes) - set(tables if tables is not None else self._table_hashes):
+            stale_ids += list(self._table_hashes.pop(table).get('items', {}).values())
+
+        trained = self._train_tracked([item for items in pending.values() for item in items] + list(extra_items))
+
+        self._schema_training_complete = True
+        for table, table_pending in pending.items():
+            hashed = {self._content_hash(t, c) for t, c in tables[table]}
+            known_items = self._table_hashes.get(table, {}).get('items', {})
+            table_ids = {h: known_items.get(h, trained.get(h)) for h in hashed if h in known_items or h in trained}
+            complete = len(table_ids) == len(hashed)
+            self._schema_training_complete &= complete
+            self._table_hashes[table] = {
+                'hash': self._table_hash(hashed) if complete else None,
+                'items': table_ids,
+            }
+        return pending, trained, stale_ids
+
+    def _remove_training_ids(self, training_ids):
+        """Remove stale training data from the model, ignoring ids that were never recorded."""
+        for training_id in training_ids:
+            if not training_id:
+                continue
+            try:
+                self.remove_training_data(training_id)
+            except Exception as e:
+                notify("warning", f"Failed to remove stale training data {training_id}. Error: {str(e)}")
+
     def train_database_schema(self):
         """Train the model with the current database schema."""
         try:
-            with self.engine.connect() as conn:
-                # First, get the information schema
-                schema_query = """
-                SELECT 
-                    TABLE_NAME, 
-                    COLUMN_NAME,
-                    COLUMN_TYPE,
-                    IS_NULLABLE,
-                    COLUMN_KEY,
-                    COLUMN_COMMENT
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_SCHEMA = 'company_v2'
-                """
-                df_schema = pd.read_sql(schema_query, conn)
-                
-                # Train on table structures
-                for table_name in df_schema['TABLE_NAME'].unique():
-                    # Get columns for this table
-                    table_cols = df_schema[df_schema['TABLE_NAME'] == table_name]
-                    
-                    # Create DDL statement
-                    ddl = f"CREATE TABLE {table_name} (\n"
-                    ddl += ",\n".join([
-                        f"  {row['COLUMN_NAME']} {row['COLUMN_TYPE']} " + 
-                        f"{'NOT NULL' if row['IS_NULLABLE'] == 'NO' else ''} " +
-                        f"{'PRIMARY KEY' if row['COLUMN_KEY'] == 'PRI' else ''}"
-                        for _, row in table_cols.iterrows()
-                    ])
-                    ddl += "\n);"
-                    
-                    # Train on DDL
-                    super().train(ddl=ddl)
-                    
-                    # Add documentation about relationships
-                    if 'manager_id' in table_cols['COLUMN_NAME'].values:
-                        doc = f"In the {table_name} table, manager_id refers to emp_id of the employee's manager"
-                        super().train(documentation=doc)
-                    
-                    if 'dept_id' in table_cols['COLUMN_NAME'].values:
-                        doc = f"In the {table_name} table, dept_id is a foreign key to departments table"
-                        super().train(documentation=doc)
-                
+            _, _, stale_ids = self._train_schema_tables(self._schema_training_items())
+            self._remove_training_ids(stale_ids)
             return True
         except Exception as e:
-            st.error(f"Schema training failed: {str(e)}")
+            notify("error", f"Schema training failed: {str(e)}")
             return False
 
     def train_model(self):
@@ -315,77 +2126,318 @@ class SQLAssistant(VannaDefault):
             # Clear existing training data
             self.clear_training()
             
-            # First, train with database schema
-            self.train_database_schema()
+            try:
+                tables = self._schema_training_items()
+            except Exception as e:
+                notify("error", f"Schema training failed: {str(e)}")
+                tables = None
             
-            # Wait a bit to ensure schema training is processed
-            time.sleep(2)
-            
-            # Load and train with examples
+            # Load examples and train everything concurrently, schema first
             examples = self._load_training_examples()
             self._training_examples = examples
+            self.question_index.build(examples)
+            example_items = [(self._content_hash(t, c), t, c) for t, c in examples]
+            _, trained, _ = self._train_schema_tables(tables, example_items)
+            if tables is None:
+                self._schema_training_complete = False
+            self._example_hashes = {h: trained[h] for h, _, _ in example_items if h in trained}
             
-            # Train in smaller batches
-            batch_size = 3
-            for i in range(0, len(examples), batch_size):
-                batch = examples[i:i + batch_size]
-                for example_type, content in batch:
-                    try:
-                        if example_type == 'documentation':
-                            super().train(documentation=content)
-                        elif example_type == 'ddl':
-                            super().train(ddl=content)
-                        elif example_type == 'sql':
-                            super().train(sql=content)
-                        elif example_type == 'pair':
-                            question, sql = content
-                            super().train(question=question, sql=sql)
-                        time.sleep(0.5)
-                    except Exception as e:
-                        st.warning(f"Failed to train example type {example_type}. Error: {str(e)}")
-                        continue
-                time.sleep(1)
-            
-            # Mark as trained only if we successfully processed some examples
-            if len(self._training_examples) > 0:
+            # Mark as trained only if we successfully processed some examples or tables
+            if trained:
                 self.mark_model_trained()
             return True
-            return False
 
         except Exception as e:
-            st.error(f"Training failed: {str(e)}")
+            notify("error", f"Training failed: {str(e)}")
             return False
 
-    def get_sql_for_question(self, question):
-        """Generate SQL query from natural language question."""
+    def sync_training(self):
+        """Train only examples and tables that changed since the last run.
+
+        Diffs training_examples.yaml against the stored example hashes and, when the
+        schema hash moved, INFORMATION_SCHEMA.COLUMNS against the stored table hashes.
+        Returns the number of examples added or removed.
+        """
+        examples = self._load_training_examples()
+        current = {self._content_hash(t, c): (t, c) for t, c in examples}
+        example_items = [(h, t, c) for h, (t, c) in current.items() if h not in self._example_hashes]
+        stale_ids = [training_id for h, training_id in self._example_hashes.items() if h not in current]
+
+        tables = self._schema_training_items() if self._schema_changed else None
+        pending, trained, stale_table_ids = self._train_schema_tables(tables, example_items)
+        self._remove_training_ids(stale_ids + stale_table_ids)
+
+        self._example_hashes = {
+            h: self._example_hashes.get(h, trained.get(h))
+            for h in current
+            if h in self._example_hashes or h in trained
+        }
+        self._training_examples = examples
+        self.question_index.build(examples)
+        return len(example_items) + sum(len(items) for items in pending.values()) + len(stale_ids + stale_table_ids)
+
+    @timed("generate_sql")
+    def generate(self, question):
+        """Generate SQL for a question, raising on errors.
+
+        Close matches of a curated question are answered locally; everything
+        else goes through the question cache to the remote model.
+        """
+        match = self.question_index.lookup(question)
+        if match is not None:
+            return match[0]
+        schema_hash = self._current_schema_hash()
+        cached = self.question_cache.get(schema_hash, question) if schema_hash is not None else None
+        if cached is not None:
+            return cached
+
+        sql = self._ask_model(question)
+        errors = self.validate_sql(sql)
+        if errors:
+            # One more try, telling the model exactly which references don't exist
+            with self._validation_lock:
+                self.validation_stats['regenerations'] += 1
+            sql = self._ask_model(self._regeneration_prompt(question, sql, errors))
+            errors = self.validate_sql(sql)
+            if errors:
+                raise SQLValidationError(errors)
+            with self._validation_lock:
+                self.validation_stats['fixed_by_regeneration'] += 1
+
+        # Only cache real SQL, not the model's "I can't answer that" replies
+        if sql and schema_hash is not None and self.is_sql_valid(sql):
+            self.question_cache.put(schema_hash, question, sql)
+        return sql
+
+    def _current_schema_hash(self):
+        """Return the hash of the current catalog, so cached answers go stale with the schema.
+
+        get_catalog() re-reads the fingerprint at most every SCHEMA_CHECK_INTERVAL seconds
+        (or defers to the schema watcher), and the hash is memoized per catalog. The
+        result is deliberately not stored in self._schema_hash, which the watcher
+        compares against to notice changes.
+        """
         try:
-            response = super().generate_sql(question)
-            
-            if isinstance(response, str):
-                return response
-            elif isinstance(response, dict) and 'sql' in response:
-                return response['sql']
+            return self.get_catalog().schema_hash()
+        except Exception:
             return None
+
+    def _ask_model(self, question):
+        """Call the remote model and return the SQL it produced, if any."""
+        response = self.generate_sql(question)
+        if isinstance(response, str):
+            return response
+        if isinstance(response, dict) and 'sql' in response:
+            return response['sql']
+        return None
+
+    @staticmethod
+    def _regeneration_prompt(question, sql, errors):
+        """Build the follow-up question sent after generated SQL failed validation."""
+        problems = "\n".join(f"- {error['message']}" for error in errors)
+        return (
+            f"{question}\n\n"
+            f"A previous attempt produced this SQL:\n{sql}\n"
+            f"It is invalid for this database:\n{problems}\n"
+            "Answer again using only tables and columns that exist in the schema."
+        )
+
+    def validate_sql(self, sql):
+        """Check generated SQL against the cached schema catalog, without a database round trip.
+
+        Returns a list of structured errors (see find_schema_errors); every SQL rejected
+        here is a query that would otherwise have failed in MySQL.
+        """
+        if not SQL_VALIDATION or not sql or not is_select(sql) or not self._sqlglot_available:
+            return []
+        try:
+            catalog = self.get_catalog()
+        except Exception:
+            return []
+        with self.metrics.span("validate_sql") as span:
+            errors = find_schema_errors(sql, catalog.column_map(), catalog.database)
+            span.set(rows=len(errors))
+        with self._validation_lock:
+            self.validation_stats['checked'] += 1
+            if errors:
+                self.validation_stats['round_trips_avoided'] += 1
+        return errors
+
+    def get_sql_for_question(self, question):
+        """Generate SQL query from natural language question, reusing cached answers."""
+        try:
+            return self.generate(question)
         except Exception as e:
-            st.error(f"Error generating SQL: {str(e)}")
+            notify("error", f"Error generating SQL: {str(e)}")
             return None
 
-    def execute_query(self, sql):
-        """Execute SQL query and return results as a pandas DataFrame."""
+    def _stream_rows(self, sql, max_rows, skip=0, handle=None, session_timeout=None):
+        """Fetch at most `max_rows` rows through a server-side cursor, one chunk at a time.
+
+        Rows before `skip` are discarded as they arrive, so peak memory is bounded
+        by the row cap rather than by the size of the full result. With a `handle`,
+        the MySQL connection id is recorded so the query can be killed; with a
+        `session_timeout` (seconds), MAX_EXECUTION_TIME is applied for this statement.
+        """
+        with self._connect() as conn:
+            if session_timeout:
+                conn.execute(sqlalchemy.text(f"SET SESSION MAX_EXECUTION_TIME = {int(session_timeout * 1000)}"))
+            try:
+                if handle is not None:
+                    handle.attach(conn.execute(sqlalchemy.text("SELECT CONNECTION_ID()")).scalar())
+                result = conn.execution_options(
+                    stream_results=True, max_row_buffer=STREAM_CHUNK_SIZE
+                ).execute(sqlalchemy.text(sql))
+                if not result.returns_rows:
+                    return pd.DataFrame()
+
+                columns = list(result.keys())
+                chunks = []
+                fetched = 0
+                truncated = False
+                build_seconds = 0.0
+                while True:
+                    rows = result.fetchmany(STREAM_CHUNK_SIZE)
+                    if not rows:
+                        break
+                    if skip:
+                        dropped = min(skip, len(rows))
+                        rows = rows[dropped:]
+                        skip -= dropped
+                    if fetched + len(rows) > max_rows:
+                        rows = rows[:max_rows - fetched]
+                        truncated = True
+                    if rows:
+                        build_start = time.perf_counter()
+                        chunks.append(pd.DataFrame(rows, columns=columns))
+                        build_seconds += time.perf_counter() - build_start
+                        fetched += len(rows)
+                    if truncated:
+                        break
+                result.close()
+            finally:
+                if handle is not None:
+                    handle.detach()
+                if session_timeout:
+                    conn.execute(sqlalchemy.text("SET SESSION MAX_EXECUTION_TIME = DEFAULT"))
+
+        build_start = time.perf_counter()
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+        df.attrs['truncated'] = truncated
+        self.metrics.observe("dataframe", build_seconds + time.perf_counter() - build_start, rows=len(df))
+        return df
+
+    def _run_query(self, sql, max_rows, offset=0, handle=None, timeout=None):
+        """Return up to `max_rows` rows starting at `offset`, flagging truncated results."""
+        if is_select(sql):
+            # Push the row window down to MySQL; one extra row tells us whether more exist
+            hint = f"/*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */ " if timeout else ""
+            body = strip_statement_tail(sql)
+            window = f"LIMIT {max_rows + 1} OFFSET {offset}"
+            try:
+                return self._stream_rows(f"SELECT {hint}* FROM (\n{body}\n) AS _sqlwizard_window {window}",
+                                         max_rows, handle=handle)
+            except Exception as e:
+                # Duplicate column names aren't allowed in a derived table; anything else is real
+                if "Duplicate column" not in str(e):
+                    raise
+            # Read just the column names, then give the derived table unique ones (e.* + d.* both have id)
+            with self._connect() as conn:
+                columns = list(conn.execute(sqlalchemy.text(f"(\n{body}\n) LIMIT 0")).keys())
+            column_list = ", ".join("`" + name.replace("`", "``") + "`" for name in unique_columns(columns))
+            return self._stream_rows(
+                f"SELECT {hint}* FROM (\n{body}\n) AS _sqlwizard_window ({column_list}) {window}",
+                max_rows, handle=handle,
+            )
+        return self._stream_rows(sql, max_rows, skip=offset, handle=handle, session_timeout=timeout)
+
+    def execute(self, sql, max_rows=MAX_RESULT_ROWS, offset=0, handle=None, timeout=QUERY_TIMEOUT):
+        """Execute a query through the result cache, raising on errors."""
+        with self.metrics.span("execute_query") as span:
+            window = (max_rows, offset)
+            cacheable = ResultCache.is_cacheable(sql)
+            df = self.result_cache.get(sql, window) if cacheable else None
+            cached = df is not None
+
+            if df is None:
+                # Read versions before the query so a concurrent write can't tag old rows as current
+                versions = self.result_cache.snapshot() if cacheable else None
+                df = self._run_query(sql, max_rows, offset, handle=handle, timeout=timeout)
+                if cacheable:
+                    self.result_cache.put(sql, df, window, versions)
+
+            if span.enabled:
+                span.set(rows=len(df), bytes=int(df.memory_usage(deep=True).sum()), cached=cached)
+            return df
+
+    def execute_query(self, sql, max_rows=MAX_RESULT_ROWS, offset=0):
+        """Execute SQL query and return at most `max_rows` rows as a pandas DataFrame.
+
+        `df.attrs['truncated']` is True when the query produced more rows than the cap.
+        """
         try:
             if not sql:
                 return None
-            
-            with self.engine.connect() as conn:
-                result = conn.execute(text(sql))
-                return pd.DataFrame(result.fetchall(), columns=result.keys())
+            return self.execute(sql, max_rows, offset)
         except Exception as e:
-            st.error(f"Error executing SQL: {str(e)}")
+            notify("error", f"Error executing SQL: {str(e)}")
             return None
 
+    def fetch_page(self, sql, page, page_size=PAGE_SIZE):
+        """Fetch one page of a query's results on demand (pages are zero-based)."""
+        return self.execute_query(sql, max_rows=page_size, offset=page * page_size)
+
+    def submit_query(self, sql, page=0, page_size=PAGE_SIZE, timeout=QUERY_TIMEOUT):
+        """Run one page of a query on the background pool.
+
+        Returns a QueryHandle, or None if the per-process query limit is reached.
+        """
+        return self.query_runner.submit(
+            lambda handle: self.execute(sql, page_size, page * page_size, handle=handle, timeout=timeout),
+            sql,
+            self._kill_query,
+            timeout,
+        )
+
+    @timed("cost_check")
+    def check_query_cost(self, sql):
+        """Estimate a query's cost with EXPLAIN FORMAT=JSON and decide whether to run it.
+
+        Returns a dict with 'action' ('allow', 'limit', 'confirm' or 'reject'), the
+        'sql' to run, a human readable 'reason' and the plan summary. Plans are
+        cached per normalized SQL until the schema changes.
+        """
+        if not is_select(sql):
+            return {'action': 'allow', 'sql': sql, 'reason': "not a SELECT"}
+        key = ResultCache.normalize(sql)
+        with self._plan_cache_lock:
+            summary = self._plan_cache.get(key)
+            if summary is not None:
+                self._plan_cache.move_to_end(key)
+        if summary is None:
+            try:
+                with self._connect() as conn:
+                    plan = conn.execute(sqlalchemy.text(f"EXPLAIN FORMAT=JSON {strip_statement_tail(sql)}")).scalar()
+                summary = analyze_explain(json.loads(plan))
+            except Exception as e:
+                # Let execution report the real error instead of guessing here
+                return {'action': 'allow', 'sql': sql, 'reason': f"EXPLAIN failed: {str(e)}"}
+            with self._plan_cache_lock:
+                self._plan_cache[key] = summary
+                while len(self._plan_cache) > PLAN_CACHE_SIZE:
+                    self._plan_cache.popitem(last=False)
+        return decide_query_cost(sql, summary)
+
+    def _kill_query(self, connection_id):
+        """Abort the statement running on another MySQL connection."""
+        with self._connect() as conn:
+            conn.execute(sqlalchemy.text(f"KILL QUERY {int(connection_id)}"))
+
     def clear_training(self):
         """Clear all training examples and reset model state."""
         self._training_examples = []
+        self._example_hashes = {}
+        self._table_hashes = {}
         if os.path.exists(self.model_state_file):
             os.remove(self.model_state_file)
         if os.path.exists(self.training_data_file):
@@ -394,58 +2446,301 @@ class SQLAssistant(VannaDefault):
     def get_schema_info(self):
         """Get the database schema information."""
         try:
-            with self.engine.connect() as conn:
-                # Get all tables
-                tables = conn.execute(text("SHOW TABLES")).fetchall()
-                schema_info = {}
-                
-                # Get columns for each table
-                for table in tables:
-                    table_name = table[0]
-                    columns = conn.execute(text(f"SHOW COLUMNS FROM {table_name}")).fetchall()
-                    schema_info[table_name] = [
-                        {
-                            'name': col[0],
-                            'type': col[1],
-                            'null': col[2],
-                            'key': col[3],
-                            'default': col[4],
-                            'extra': col[5]
-                        }
-                        for col in columns
-                    ]
-                return schema_info
+            catalog = self.get_catalog()
+            schema_info = {}
+            for table_name in catalog.table_names():
+                schema_info[table_name] = [
+                    {
+                        'name': col['COLUMN_NAME'],
+                        'type': col['COLUMN_TYPE'],
+                        'null': col['IS_NULLABLE'],
+                        'key': col['COLUMN_KEY'],
+                        'default': col['COLUMN_DEFAULT'],
+                        'extra': col['EXTRA']
+                    }
+                    for col in catalog.table_columns(table_name).to_dict('records')
+                ]
+            return schema_info
         except Exception as e:
-            st.error(f"Error fetching schema: {str(e)}")
+            notify("error", f"Error fetching schema: {str(e)}")
             return None
 
-def initialize_session_state():
-    """Initialize session state variables for chat interface."""
-    if 'messages' not in st.session_state:
-        st.session_state.messages = [
-            {"role": "assistant", "content": "Hey! I'm your SQL Assistant. How can I help you today?"}
-        ]
+@st.cache_resource
+def get_instrumentation():
+    """Create the process-wide instrumentation (and metrics endpoint) once."""
+    return build_instrumentation()
+
+@st.cache_resource
+def get_exporter():
+    """Create the process-wide result exporter and its temp directory once."""
+    return ResultExporter(get_instrumentation())
+
+@st.cache_resource
+def get_cold_start():
+    """Process-wide record of the first script run's import and first-paint times."""
+    return {}
+
+def record_cold_start():
+    """Record import and first-paint time once per process, warning when over budget."""
+    cold_start = get_cold_start()
+    if not cold_start:
+        cold_start['import_seconds'] = IMPORT_SECONDS
+        cold_start['first_paint_seconds'] = time.perf_counter() - _SCRIPT_STARTED
+        get_instrumentation().observe("import", cold_start['import_seconds'])
+        get_instrumentation().observe("first_paint", cold_start['first_paint_seconds'])
+        if cold_start['first_paint_seconds'] > COLD_START_BUDGET:
+            logging.getLogger("sqlwizard").warning(
+                "Cold start took %.2fs to first paint (budget %.2fs, imports %.2fs)",
+                cold_start['first_paint_seconds'], COLD_START_BUDGET, cold_start['import_seconds']
+            )
+    return cold_start
+
+def create_assistant(database, query_runner):
+    """Create, connect and train the SQL Assistant for one database."""
+    assistant = SQLAssistant(
+        api_key=VANNA_API_KEY, instrumentation=get_instrumentation(), database=database, query_runner=query_runner
+    )
+    if not assistant.setup_database():
+        return None
+    assistant.start_health_check()
+    assistant.start_schema_watcher()
+    return assistant
+
+@st.cache_resource
+def get_registry():
+    """Create the process-wide registry of per-database assistants once."""
+    return AssistantRegistry(create_assistant)
+
+def get_assistant(database):
+    """Return the shared, warmed-up assistant for a database, setting it up on first use.
+
+    Instances are shared by every session and rerun, so per-message latency
+    only covers SQL generation and execution. Returns None if setup fails.
+    """
+    registry = get_registry()
+    if registry.is_loaded(database):
+        return registry.get(database)
+    with st.spinner(f"🔌 Warming up SQL Assistant for {database}..."):
+        return registry.get(database)
+
+def new_chat_history():
+    """Return a chat history holding only the greeting."""
+    return ChatHistory([
+        {"role": "assistant", "content": "Hey! I'm your SQL Assistant. How can I help you today?"}
+    ])
+
+def initialize_session_state(database):
+    """Initialize session state variables for chat interface.
+
+    Each database keeps its own chat history; `messages` points at the selected one.
+    """
+    if 'histories' not in st.session_state:
+        st.session_state.histories = {}
+    if database not in st.session_state.histories:
+        st.session_state.histories[database] = new_chat_history()
+    st.session_state.messages = st.session_state.histories[database]
     if 'sql_queries' not in st.session_state:
         st.session_state.sql_queries = {}
 
-def display_message(message, is_user=False):
+def cancel_active_query(assistant):
+    """Cancel the query the current session is waiting on."""
+    pending = st.session_state.get("pending_query")
+    if pending is not None:
+        assistant.query_runner.cancel(pending["handle"])
+        st.session_state.pending_query = None
+        pending["history"].append({
+            "role": "assistant",
+            "content": "⏹️ Query cancelled.",
+            "sql": pending["sql"]
+        })
+
+def collect_query():
+    """Turn the session's background query into an answer once it has finished.
+
+    The query is tracked in session state so it survives reruns triggered while
+    it runs; the answer goes to the chat the question was asked in. Returns
+    False while the query is still running.
+    """
+    pending = st.session_state.get("pending_query")
+    if pending is None:
+        return True
+    handle = pending["handle"]
+    if not handle.done():
+        return False
+    st.session_state.pending_query = None
+    timings = pending["timings"]
+    try:
+        results = handle.result()
+        timings["execute"] = handle.elapsed()
+        get_instrumentation().observe("execute", timings["execute"], rows=len(results))
+        response = {
+            "role": "assistant",
+            "content": pending["content"],
+            "sql": pending["sql"],
+            "results": results,
+            "timings": timings
+        }
+    except Exception as e:
+        # Check the handle rather than `except QueryCancelled`: the cached runner raises
+        # the class from the rerun that created it, not the one defined in this rerun
+        response = {
+            "role": "assistant",
+            "content": f"⏹️ {str(e)}" if handle.cancelled else f"❌ Error executing query: {str(e)}",
+            "sql": pending["sql"]
+        }
+    pending["history"].append(response)
+    return True
+
+def wait_for_query(assistant):
+    """Show a Cancel button and progress while the session's query runs, then rerun to show its answer.
+
+    A rerun triggered meanwhile interrupts this wait but not the query; the next
+    run picks the query up again.
+    """
+    if collect_query():
+        st.rerun()
+    handle = st.session_state.pending_query["handle"]
+    cancel_slot = st.empty()
+    cancel_slot.button("⏹️ Cancel query", on_click=cancel_active_query, args=(assistant,))
+    with st.spinner("⚡ Executing query..."):
+        status = st.empty()
+        while not handle.done():
+            # Touching the page lets Streamlit interrupt this run when Cancel is clicked
+            status.caption(f"Running for {handle.elapsed():.1f}s")
+            time.sleep(0.1)
+        status.empty()
+    cancel_slot.empty()
+    collect_query()
+    st.rerun()
+
+def load_full_results(assistant, message):
+    """Fetch the capped full result of a message's query for download."""
+    message["full_results"] = assistant.execute_query(message["sql"])
+
+def display_message(message, is_user=False, assistant=None, key=None):
     """Display a single message in the chat interface."""
     with st.chat_message("user" if is_user else "assistant"):
         st.write(message["content"])
+        if not is_user and "timings" in message:
+            timings = message["timings"]
+            st.caption(
+                f"⏱️ SQL generated in {timings['generate']:.2f}s · "
+                f"executed in {timings.get('execute', 0):.2f}s"
+            )
         if not is_user and "sql" in message:
             with st.expander("📊 View SQL Query"):
                 st.code(message["sql"], language="sql")
+        if not is_user and message.get("needs_confirmation") and not message.get("confirmed"):
+            st.button("▶️ Run anyway", key=f"confirm_{key}", on_click=confirm_query, args=(message,))
+        if not is_user and "spilled" in message:
+            # Older results live on disk and are only read back while their toggle is on
+            history = st.session_state.messages
+            rows = message["spilled"]["results"][2] if "results" in message["spilled"] else 0
+            if st.toggle(f"📂 Show results ({rows:,} rows)", key=f"load_{key}"):
+                history.load(message)
+            else:
+                history.spill(message)
         if not is_user and "results" in message:
             with st.expander("📈 View Results"):
-                st.dataframe(message["results"])
-                if isinstance(message["results"], pd.DataFrame) and not message["results"].empty:
-                    csv = message["results"].to_csv(index=False)
-                    st.download_button(
-                        label="📥 Download CSV",
-                        data=csv,
-                        file_name="query_results.csv",
-                        mime="text/csv"
+                results = message["results"]
+                has_more = isinstance(results, pd.DataFrame) and results.attrs.get('truncated', False)
+                page_df = results
+                if has_more and assistant is not None:
+                    page = st.number_input("Page", min_value=1, value=1, step=1, key=f"page_{key}") - 1
+                    if page > 0:
+                        # Later pages are fetched from the database only when asked for
+                        page_df = assistant.fetch_page(message["sql"], page)
+                st.dataframe(page_df)
+
+                download_df = results
+                if has_more:
+                    download_df = message.get("full_results")
+                    if download_df is None:
+                        st.button(
+                            f"📦 Load full result (up to {MAX_RESULT_ROWS:,} rows)",
+                            key=f"load_full_{key}",
+                            on_click=load_full_results,
+                            args=(assistant, message)
+                        )
+                    elif download_df.attrs.get('truncated', False):
+                        st.caption(f"⚠️ Result truncated to the first {MAX_RESULT_ROWS:,} rows")
+                if isinstance(download_df, pd.DataFrame) and not download_df.empty:
+                    # The file is written only when the button is clicked, then reused from disk
+                    result_id = message.setdefault("result_id", uuid.uuid4().hex)
+                    if download_df is not results:
+                        result_id = f"{result_id}-full"
+                    exporter = get_exporter()
+                    format_col, button_col = st.columns([1, 2])
+                    label = format_col.selectbox(
+                        "Format", exporter.formats(), key=f"export_format_{key}", label_visibility="collapsed"
                     )
+                    extension, mime, _ = EXPORT_FORMATS[label]
+                    button_col.download_button(
+                        label=f"📥 Download {label}",
+                        data=functools.partial(exporter.read, result_id, download_df, label),
+                        file_name=f"query_results.{extension}",
+                        mime=mime,
+                        key=f"download_{key}",
+                        on_click="ignore"
+                    )
+
+def add_response(response, assistant=None):
+    """Append an assistant message to the chat and render it."""
+    st.session_state.messages.append(response)
+    with get_instrumentation().span("render"):
+        display_message(response, assistant=assistant, key=len(st.session_state.messages) - 1)
+
+def confirm_query(message):
+    """Queue an expensive query the user chose to run anyway."""
+    message["confirmed"] = True
+    st.session_state.confirmed_query = message["sql"]
+
+def respond_with_query(assistant, sql_query, timings, check_cost=True):
+    """Cost-check a generated query and start it in the background.
+
+    The answer is added by wait_for_query() once the query finishes.
+    """
+    content = "Here's what I found:"
+    try:
+        if check_cost:
+            estimate = assistant.check_query_cost(sql_query)
+            if estimate['action'] == 'reject':
+                add_response({
+                    "role": "assistant",
+                    "content": f"🛑 I won't run this query: {estimate['reason']}",
+                    "sql": sql_query
+                })
+                return
+            if estimate['action'] == 'confirm':
+                add_response({
+                    "role": "assistant",
+                    "content": f"⚠️ This query looks expensive: {estimate['reason']}. Run it anyway?",
+                    "sql": sql_query,
+                    "needs_confirmation": True
+                })
+                return
+            if estimate['action'] == 'limit':
+                sql_query = estimate['sql']
+                content = f"Here's what I found (limited to {COST_GUARD['auto_limit']:,} rows: {estimate['reason']}):"
+
+        # Execute query in the background; only the first page is fetched up front
+        handle = assistant.submit_query(sql_query)
+        if handle is None:
+            raise RuntimeError("Too many queries are running right now. Please try again in a moment.")
+        st.session_state.pending_query = {
+            "handle": handle,
+            "sql": sql_query,
+            "content": content,
+            "timings": timings,
+            "history": st.session_state.messages
+        }
+        
+    except Exception as e:
+        add_response({
+            "role": "assistant",
+            "content": f"❌ Error executing query: {str(e)}",
+            "sql": sql_query
+        })
 
 def main():
     """Main application entry point with enhanced chat interface."""
@@ -455,13 +2750,13 @@ def main():
     with open('static/styles.css') as f:
         st.markdown(f'<style>{f.read()}</style>', unsafe_allow_html=True)
 
+    database = st.sidebar.selectbox("🗄️ Database", list(DATABASES), key="database")
+
     # Header with actions
     col1, col2, col3 = st.columns([2,8,2])
     with col1:
         if st.button("🆕 New Chat"):
-            st.session_state.messages = [
-                {"role": "assistant", "content": "Hey! I'm your SQL Assistant. How can I help you today?"}
-            ]
+            st.session_state.setdefault("histories", {})[database] = new_chat_history()
             st.session_state.sql_queries = {}
             st.experimental_rerun()
     with col2:
@@ -471,24 +2766,61 @@ def main():
             st.sidebar.title("Settings")
             st.sidebar.toggle("Dark Mode")
             st.sidebar.toggle("Show SQL Queries")
+    cold_start = record_cold_start()
 
-    # Initialize SQL Assistant
-    assistant = SQLAssistant(api_key=VANNA_API_KEY)
-
-    # Setup database connection
-    if not assistant.setup_database():
-        st.error("❌ Failed to connect to database")
+    # Get the shared, already warmed-up SQL Assistant for the selected database;
+    # a failed setup is not kept, so the next rerun retries it
+    assistant = get_assistant(database)
+    if assistant is None:
+        st.error(f"❌ Failed to connect to database {database}")
         return
 
+    if not assistant.healthy:
+        st.warning("⚠️ Database health check failed, reconnecting...")
+    st.sidebar.caption(f"🚀 Assistant warmed up in {assistant.startup_seconds:.2f}s")
+    if assistant.last_schema_change is not None:
+        st.sidebar.caption(f"🔄 Schema change picked up at {assistant.last_schema_change:%H:%M:%S}")
+    st.sidebar.caption(
+        f"🧊 Cold start: imports {cold_start['import_seconds']:.2f}s · "
+        f"first paint {cold_start['first_paint_seconds']:.2f}s"
+    )
+    with st.sidebar.expander("📦 Result cache"):
+        st.json(assistant.result_cache.stats())
+        st.caption("Export files")
+        st.json(get_exporter().stats())
+    with st.sidebar.expander("🎯 Curated answers"):
+        st.json(assistant.question_index.stats())
+    with st.sidebar.expander("🧪 SQL validation"):
+        st.json(assistant.validation_stats)
+    with st.sidebar.expander("🔌 Connection pool"):
+        st.json(assistant.pool_metrics.snapshot())
+    with st.sidebar.expander("🗄️ Loaded databases"):
+        st.json(get_registry().stats())
+    panel = get_instrumentation().get_sink("panel")
+    if panel is not None:
+        with st.sidebar.expander("⏱️ Performance"):
+            st.dataframe(panel.summary())
+
     # Initialize session state
-    initialize_session_state()
+    initialize_session_state(database)
+
+    # A query still running from an earlier run is answered as soon as it finishes
+    collect_query()
 
     # Display chat messages
-    for message in st.session_state.messages:
-        display_message(message, message["role"] == "user")
+    with get_instrumentation().span("render_history", messages=len(st.session_state.messages)):
+        for index, message in enumerate(st.session_state.messages):
+            display_message(message, message["role"] == "user", assistant, key=index)
 
-    # Chat input
-    if prompt := st.chat_input("💭 Ask me anything about your data..."):
+    # Run a query the user confirmed despite its estimated cost
+    confirmed_sql = st.session_state.pop("confirmed_query", None)
+    if confirmed_sql:
+        with st.spinner("🤔 Thinking..."):
+            respond_with_query(assistant, confirmed_sql, {"generate": 0.0}, check_cost=False)
+
+    # Chat input; one query per session at a time
+    querying = st.session_state.get("pending_query") is not None
+    if prompt := st.chat_input("💭 Ask me anything about your data...", disabled=querying):
         # Add user message
         st.session_state.messages.append({"role": "user", "content": prompt})
         display_message(st.session_state.messages[-1], True)
@@ -496,31 +2828,11 @@ def main():
         # Generate response
         with st.spinner("🤔 Thinking..."):
             # Generate SQL
+            start = time.perf_counter()
             sql_query = assistant.get_sql_for_question(prompt)
+            timings = {"generate": time.perf_counter() - start}
             if sql_query:
-                try:
-                    # Execute query
-                    with st.spinner("⚡ Executing query..."):
-                        results = assistant.execute_query(sql_query)
-                        
-                    # Add assistant response
-                    response = {
-                        "role": "assistant",
-                        "content": "Here's what I found:",
-                        "sql": sql_query,
-                        "results": results
-                    }
-                    st.session_state.messages.append(response)
-                    display_message(response)
-                    
-                except Exception as e:
-                    error_response = {
-                        "role": "assistant",
-                        "content": f"❌ Error executing query: {str(e)}",
-                        "sql": sql_query
-                    }
-                    st.session_state.messages.append(error_response)
-                    display_message(error_response)
+                respond_with_query(assistant, sql_query, timings)
             else:
                 error_response = {
                     "role": "assistant",
@@ -529,5 +2841,10 @@ def main():
                 st.session_state.messages.append(error_response)
                 display_message(error_response)
 
+    if st.session_state.get("pending_query") is not None:
+        wait_for_query(assistant)
+
+IMPORT_SECONDS = time.perf_counter() - _SCRIPT_STARTED  # How long this module took to import
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,101 @@
+"""Tests for the EXPLAIN-based cost guard (analyze_explain / decide_query_cost)."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_assistant import COST_GUARD, analyze_explain, decide_query_cost  # noqa: E402
+
+
+def table(name, rows, access_type='ALL', produced=None, **extra):
+    """One EXPLAIN FORMAT=JSON table step."""
+    step = {'table_name': name, 'access_type': access_type, 'rows_examined_per_scan': rows,
+            'rows_produced_per_join': rows if produced is None else produced}
+    step.update(extra)
+    return {'table': step}
+
+
+def plan(*steps, cost=1.0):
+    """An EXPLAIN FORMAT=JSON document joining `steps` in a nested loop."""
+    return {'query_block': {'cost_info': {'query_cost': str(cost)}, 'nested_loop': list(steps)}}
+
+
+def test_single_table_scan():
+    summary = analyze_explain({'query_block': {'cost_info': {'query_cost': '12.5'}, **table('t', 50)}})
+    assert summary['estimated_rows'] == 50
+    assert summary['cost'] == 12.5
+    assert summary['full_scans'] == [('t', 50.0)]
+    assert summary['cartesian'] == []
+
+
+def test_nested_loop_multiplies_prefix_rows():
+    summary = analyze_explain(plan(
+        table('employees', 1000),
+        table('departments', 1, access_type='eq_ref', produced=1000),
+        table('salaries', 10, access_type='ref'),
+    ))
+    # 1000 scanned, then 1000 x 1 lookups, then 1000 x 10 lookups
+    assert summary['estimated_rows'] == 1000 + 1000 + 10000
+    assert summary['full_scans'] == [('employees', 1000.0)]
+    assert summary['cartesian'] == []
+
+
+def test_hash_join_without_condition_is_cartesian():
+    summary = analyze_explain(plan(
+        table('employees', 300000),
+        table('departments', 1000, produced=300000000, using_join_buffer='hash join'),
+    ))
+    assert summary['cartesian'] == [('departments', 300000000.0)]
+    assert decide_query_cost("SELECT * FROM employees, departments", summary)['action'] == 'reject'
+
+
+def test_hash_join_with_condition_is_not_cartesian():
+    summary = analyze_explain(plan(
+        table('employees', 300000),
+        table('departments', 1000, produced=300000, using_join_buffer='hash join',
+              attached_condition="(`departments`.`id` = `employees`.`department_id`)"),
+    ))
+    assert summary['cartesian'] == []
+
+
+def test_small_query_is_allowed():
+    summary = analyze_explain(plan(table('departments', 20)))
+    decision = decide_query_cost("SELECT * FROM departments", summary)
+    assert decision['action'] == 'allow'
+    assert decision['sql'] == "SELECT * FROM departments"
+
+
+def test_expensive_query_needs_confirmation():
+    summary = analyze_explain(plan(table('events', COST_GUARD['confirm_rows'] * 2)))
+    assert decide_query_cost("SELECT * FROM events", summary)['action'] == 'confirm'
+
+
+def test_large_scan_gets_a_limit():
+    summary = analyze_explain(plan(table('employees', 300000)))
+    decision = decide_query_cost("SELECT * FROM employees;", summary)
+    assert decision['action'] == 'limit'
+    assert decision['sql'] == f"SELECT * FROM employees\nLIMIT {COST_GUARD['auto_limit']}"
+
+
+def test_existing_limit_is_kept():
+    summary = analyze_explain(plan(table('employees', 300000)))
+    for sql in ("SELECT * FROM employees LIMIT 10",
+                "SELECT * FROM employees LIMIT 10 OFFSET 20;",
+                "SELECT * FROM employees LIMIT 10; -- first page",
+                "SELECT * FROM employees LIMIT 10 FOR UPDATE"):
+        decision = decide_query_cost(sql, summary)
+        assert decision['action'] == 'allow', sql
+        assert decision['sql'] == sql
+
+
+def test_limit_goes_before_locking_clause():
+    summary = analyze_explain(plan(table('employees', 300000)))
+    decision = decide_query_cost("SELECT * FROM employees FOR UPDATE", summary)
+    assert decision['sql'] == f"SELECT * FROM employees\nLIMIT {COST_GUARD['auto_limit']} FOR UPDATE"
+
+
+def test_trailing_comment_is_dropped_before_limit():
+    summary = analyze_explain(plan(table('employees', 300000)))
+    decision = decide_query_cost("SELECT * FROM employees; -- everyone", summary)
+    assert decision['sql'] == f"SELECT * FROM employees\nLIMIT {COST_GUARD['auto_limit']}"
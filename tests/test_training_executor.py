@@ -0,0 +1,121 @@
+"""Tests for TrainingExecutor and TokenBucket, using a stub in place of Vanna's train()."""
+
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_assistant import TokenBucket, TrainingExecutor, is_transient_error  # noqa: E402
+
+EXAMPLES = [('sql', f"SELECT {i}") for i in range(8)]
+
+
+class StubTrain:
+    """Stands in for train(): sleeps, then fails with the queued errors before succeeding."""
+
+    def __init__(self, latency=0.0, errors=None):
+        self.latency = latency
+        self.errors = dict(errors or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, **kwargs):
+        with self._lock:
+            self.calls.append((time.monotonic(), kwargs))
+            queued = self.errors.get(kwargs.get('sql'))
+            error = queued.pop(0) if queued else None
+        time.sleep(self.latency)
+        if error is not None:
+            raise error
+        return f"id-{kwargs['sql']}"
+
+
+def http_error(status):
+    """A requests HTTPError carrying a response with the given status code."""
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(f"{status} Error", response=response)
+
+
+def timed_run(executor, examples):
+    start = time.perf_counter()
+    report = executor.run(examples)
+    return report, time.perf_counter() - start
+
+
+def test_wall_time_scales_with_concurrency():
+    serial, serial_seconds = timed_run(TrainingExecutor(StubTrain(0.05), concurrency=1, rate=1000), EXAMPLES)
+    parallel, parallel_seconds = timed_run(TrainingExecutor(StubTrain(0.05), concurrency=4, rate=1000), EXAMPLES)
+    assert serial_seconds >= 0.05 * len(EXAMPLES)
+    assert parallel_seconds < serial_seconds / 2
+    assert [entry['id'] for entry in parallel] == [entry['id'] for entry in serial]
+
+
+def test_rate_limit_bounds_wall_time():
+    train = StubTrain()
+    _, seconds = timed_run(TrainingExecutor(train, concurrency=8, rate=20), EXAMPLES)
+    # A burst of 20 tokens covers all eight calls; a bucket of one spaces them 50ms apart
+    assert seconds < 0.2
+    bucket = TokenBucket(20, capacity=1)
+    start = time.perf_counter()
+    for _ in range(6):
+        bucket.acquire()
+    assert time.perf_counter() - start >= 0.2
+
+
+def test_report_keeps_input_order():
+    report = TrainingExecutor(StubTrain(), concurrency=4, rate=1000).run(EXAMPLES)
+    assert [entry['id'] for entry in report] == [f"id-SELECT {i}" for i in range(len(EXAMPLES))]
+    assert all(entry['status'] == 'ok' and entry['attempts'] == 1 for entry in report)
+    assert TrainingExecutor(StubTrain()).run([]) == []
+
+
+def test_transient_errors_are_retried_with_backoff():
+    train = StubTrain(errors={'SELECT 0': [ConnectionResetError("connection reset"), http_error(503)]})
+    report = TrainingExecutor(train, concurrency=1, rate=1000, max_retries=3, backoff=0.02).run(EXAMPLES[:1])
+    assert report[0]['status'] == 'ok'
+    assert report[0]['attempts'] == 3
+    times = [at for at, _ in train.calls]
+    # Backoff doubles: 20ms before the second attempt, 40ms before the third
+    assert times[1] - times[0] >= 0.02
+    assert times[2] - times[1] >= 0.04
+
+
+def test_failure_report():
+    train = StubTrain(errors={
+        'SELECT 0': [ValueError("bad example")],
+        'SELECT 1': [TimeoutError("timed out")] * 5,
+    })
+    report = TrainingExecutor(train, concurrency=2, rate=1000, max_retries=2, backoff=0.001).run(EXAMPLES[:3])
+    permanent, exhausted, ok = report
+    # Errors that aren't transient fail on the first attempt
+    assert permanent['status'] == 'failed'
+    assert permanent['attempts'] == 1
+    assert permanent['error'] == "bad example"
+    assert permanent['id'] is None
+    # Transient errors give up after max_retries retries
+    assert exhausted['status'] == 'failed'
+    assert exhausted['attempts'] == 3
+    assert exhausted['error'] == "timed out"
+    assert ok['status'] == 'ok'
+    assert ok['error'] is None
+    assert all(entry['type'] == 'sql' and entry['seconds'] >= 0 for entry in report)
+
+
+def test_transient_errors_are_decided_by_type_and_status():
+    assert is_transient_error(ConnectionResetError())
+    assert is_transient_error(TimeoutError())
+    assert is_transient_error(requests.exceptions.ConnectionError())
+    assert is_transient_error(requests.exceptions.ReadTimeout())
+    assert is_transient_error(http_error(429))
+    assert is_transient_error(http_error(503))
+    # Permanent errors that merely mention a status code or "connection"
+    assert not is_transient_error(Exception("Unknown column 'connection_id'"))
+    assert not is_transient_error(Exception("SELECT * FROM orders LIMIT 500"))
+    assert not is_transient_error(http_error(400))
+    assert not is_transient_error(requests.exceptions.InvalidURL())
+    assert not is_transient_error(FileNotFoundError())
@@ -0,0 +1,135 @@
+"""Tests for incremental training (sync_training / _train_schema_tables), using a stub in place of Vanna's train()."""
+
+import json
+import os
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_assistant import SchemaCatalog, SQLAssistant  # noqa: E402
+
+COLUMNS = {
+    'customers': [('id', 'int', 'PRI'), ('name', 'varchar(100)', '')],
+    'orders': [('id', 'int', 'PRI'), ('total', 'decimal(10,2)', '')],
+}
+EXAMPLES = [
+    ('documentation', "Totals are in USD."),
+    ('sql', "SELECT COUNT(*) FROM orders"),
+    ('pair', ("How many customers?", "SELECT COUNT(*) FROM customers")),
+]
+
+
+def catalog(columns):
+    """A SchemaCatalog over {table: [(column, type, key)]}, without foreign keys."""
+    rows = [
+        {'TABLE_NAME': table, 'COLUMN_NAME': name, 'ORDINAL_POSITION': position, 'COLUMN_TYPE': column_type,
+         'IS_NULLABLE': 'NO', 'COLUMN_KEY': key, 'COLUMN_DEFAULT': None, 'EXTRA': '', 'COLUMN_COMMENT': ''}
+        for table, table_columns in columns.items()
+        for position, (name, column_type, key) in enumerate(table_columns, 1)
+    ]
+    key_usage = pd.DataFrame(columns=['TABLE_NAME', 'COLUMN_NAME', 'CONSTRAINT_NAME', 'ORDINAL_POSITION',
+                                      'REFERENCED_TABLE_NAME', 'REFERENCED_COLUMN_NAME'])
+    tables = pd.DataFrame({'TABLE_NAME': list(columns)})
+    return SchemaCatalog('testdb', pd.DataFrame(rows), tables, key_usage, ('testdb',))
+
+
+class StubAssistant(SQLAssistant):
+    """SQLAssistant with a fixed schema and examples, recording train() and remove_training_data() calls."""
+
+    def __init__(self, state_dir, columns=COLUMNS, examples=EXAMPLES, fail=()):
+        super().__init__(api_key="test")
+        self.model_state_file = str(state_dir / "model_state.json")
+        self.training_data_file = str(state_dir / "training_data.json")
+        self.columns = columns
+        self.examples = list(examples)
+        self.fail = set(fail)
+        self.trained = []
+        self.removed = []
+
+    def get_catalog(self, force=False, recheck=False):
+        return catalog(self.columns)
+
+    def _load_training_examples(self):
+        return list(self.examples)
+
+    def train(self, **kwargs):
+        content = next(iter(kwargs.values()))
+        if any(name in str(content) for name in self.fail):
+            raise ValueError(f"rejected {content}")
+        self.trained.append(kwargs)
+        return f"id-{content}"
+
+    def remove_training_data(self, id):
+        self.removed.append(id)
+        return True
+
+
+def start(assistant):
+    """Follow setup_database's training steps: full training first, then incremental syncs."""
+    if not assistant.is_model_trained() or not assistant._load_training_data():
+        assistant.train_model()
+        assistant._save_training_data()
+        return None
+    changes = assistant.sync_training()
+    if changes:
+        assistant.mark_model_trained()
+        assistant._save_training_data()
+    return changes
+
+
+def saved_schema_hash(assistant):
+    with open(assistant.training_data_file) as f:
+        return json.load(f)['schema_hash']
+
+
+def test_restart_without_changes_trains_nothing(tmp_path):
+    first = StubAssistant(tmp_path)
+    start(first)
+    assert len(first.trained) == len(COLUMNS) + len(EXAMPLES)
+
+    restarted = StubAssistant(tmp_path)
+    assert start(restarted) == 0
+    assert restarted.trained == []
+    assert restarted.removed == []
+    assert saved_schema_hash(restarted) == catalog(COLUMNS).schema_hash()
+
+
+def test_added_column_retrains_only_its_table(tmp_path):
+    start(StubAssistant(tmp_path))
+
+    columns = dict(COLUMNS, orders=COLUMNS['orders'] + [('status', 'varchar(20)', '')])
+    restarted = StubAssistant(tmp_path, columns=columns)
+    assert start(restarted) == 2
+    assert len(restarted.trained) == 1
+    assert "status varchar(20)" in restarted.trained[0]['ddl']
+    assert restarted.removed == ["id-CREATE TABLE orders (\n  id int NOT NULL PRIMARY KEY,\n  total decimal(10,2) NOT NULL\n);"]
+    assert saved_schema_hash(restarted) == catalog(columns).schema_hash()
+
+
+def test_removed_example_is_removed_from_the_model(tmp_path):
+    start(StubAssistant(tmp_path))
+
+    restarted = StubAssistant(tmp_path, examples=[EXAMPLES[0], EXAMPLES[2]])
+    assert start(restarted) == 1
+    assert restarted.trained == []
+    assert restarted.removed == ["id-SELECT COUNT(*) FROM orders"]
+
+
+def test_partial_table_failure_is_retried_on_next_start(tmp_path):
+    first = StubAssistant(tmp_path, fail={'CREATE TABLE orders'})
+    start(first)
+    assert first.last_training_report and any(entry['status'] == 'failed' for entry in first.last_training_report)
+    assert saved_schema_hash(first) is None
+
+    restarted = StubAssistant(tmp_path)
+    assert start(restarted) == 1
+    assert len(restarted.trained) == 1
+    assert "CREATE TABLE orders" in restarted.trained[0]['ddl']
+    assert restarted.removed == []
+    assert saved_schema_hash(restarted) == catalog(COLUMNS).schema_hash()
+
+    again = StubAssistant(tmp_path)
+    assert start(again) == 0
+    assert again.trained == []